@@ -0,0 +1,484 @@
+"""Кеши, общие для всех процессов сервера на одной машине."""
+import fcntl
+import mmap
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Столько переменных SQLite принимает в одном запросе по умолчанию
+MAX_VARIABLES = 900
+# Счётчик версии в файле меток TwoLevelCache
+STAMP = struct.Struct('<Q')
+_MISSING = object()
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS cache_size ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 1),'
+    ' total INTEGER NOT NULL'
+    ')',
+    'INSERT OR IGNORE INTO cache_size (id, total) VALUES (1, 0)',
+)
+
+
+def _chunks(items, size=MAX_VARIABLES):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    """Кеш в базе SQLite в режиме WAL.
+
+    Файл LOCATION открывают все процессы машины, поэтому у них общие
+    записи и поколения лент, а кеш переживает перезапуск. Объём ограничен
+    OPTIONS['MAX_SIZE'] байт: при превышении удаляются записи, которые
+    дольше всех не читали. Целые числа хранятся как INTEGER, поэтому
+    incr() выполняется одним UPDATE.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 256 * 1024 * 1024))
+        # Время последнего чтения обновляется не чаще раза в столько секунд
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 60))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+        return connection
+
+    def _write(self):
+        return _WriteTransaction(self._connection)
+
+    @staticmethod
+    def _encode(value):
+        if (isinstance(value, int) and not isinstance(value, bool)
+                and -2 ** 63 <= value < 2 ** 63):
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    @staticmethod
+    def _size(key, value):
+        return len(key) + (8 if isinstance(value, int) else len(value))
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fetch(self, keys):
+        now = time.time()
+        found = {}
+        for chunk in _chunks(keys):
+            marks = ','.join('?' * len(chunk))
+            rows = self._connection.execute(
+                f'SELECT key, value, accessed FROM cache '
+                f'WHERE key IN ({marks}) '
+                f'AND (expires IS NULL OR expires > ?)',
+                (*chunk, now)
+            ).fetchall()
+            untouched = [
+                key for key, value, accessed in rows
+                if accessed < now - self._touch_interval
+            ]
+            if untouched:
+                self._touch_read(untouched, now)
+            found.update((key, value) for key, value, accessed in rows)
+        return found
+
+    def _touch_read(self, keys, now):
+        try:
+            with self._write() as cursor:
+                cursor.execute(
+                    f'UPDATE cache SET accessed = ? '
+                    f'WHERE key IN ({",".join("?" * len(keys))})',
+                    (now, *keys)
+                )
+        except sqlite3.OperationalError:
+            # Порядок вытеснения приблизительный: занятую базу не ждём.
+            pass
+
+    def _store(self, cursor, key, value, expires, now):
+        old = cursor.execute(
+            'SELECT size FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        size = self._size(key, value)
+        cursor.execute(
+            'INSERT OR REPLACE INTO cache '
+            '(key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+            (key, value, expires, now, size)
+        )
+        cursor.execute(
+            'UPDATE cache_size SET total = total + ? WHERE id = 1',
+            (size - (old[0] if old else 0),)
+        )
+
+    def _evict(self, cursor, now):
+        total = cursor.execute(
+            'SELECT total FROM cache_size WHERE id = 1'
+        ).fetchone()[0]
+        if total <= self._max_size:
+            return
+        freed = cursor.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache WHERE expires <= ?',
+            (now,)
+        ).fetchone()[0]
+        cursor.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        total -= freed
+        # Освобождаем с запасом, чтобы не вытеснять на каждой записи.
+        target = self._max_size * 0.9
+        rows = cursor.execute(
+            'SELECT key, size FROM cache ORDER BY accessed'
+        )
+        victims = []
+        for key, size in rows:
+            if total <= target:
+                break
+            victims.append(key)
+            total -= size
+        for chunk in _chunks(victims):
+            marks = ','.join('?' * len(chunk))
+            cursor.execute(f'DELETE FROM cache WHERE key IN ({marks})', chunk)
+        cursor.execute(
+            'UPDATE cache_size SET total = ? WHERE id = 1', (max(total, 0),)
+        )
+
+    def _alive(self, cursor, key, now):
+        return cursor.execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, now)
+        ).fetchone() is not None
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as cursor:
+            if self._alive(cursor, key, now):
+                return False
+            self._store(
+                cursor, key, self._encode(value),
+                self.get_backend_timeout(timeout), now
+            )
+            self._evict(cursor, now)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._fetch([key])
+        return self._decode(found[key]) if key in found else default
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as cursor:
+            cursor.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time())
+            )
+            return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return bool(self._fetch([key]))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._write() as cursor:
+            cursor.execute(
+                'UPDATE cache SET value = value + ? '
+                "WHERE key = ? AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                (delta, key, time.time())
+            )
+            if not cursor.rowcount:
+                raise ValueError("Key '%s' not found" % key)
+            return cursor.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)
+            ).fetchone()[0]
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = self._fetch(list(keys))
+        return {
+            keys[key]: self._decode(value) for key, value in found.items()
+        }
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        with self._write() as cursor:
+            for key, value in data.items():
+                self._store(
+                    cursor, self._key(key, version), self._encode(value),
+                    expires, now
+                )
+            self._evict(cursor, now)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._write() as cursor:
+            for chunk in _chunks(keys):
+                marks = ','.join('?' * len(chunk))
+                freed = cursor.execute(
+                    f'SELECT COALESCE(SUM(size), 0) FROM cache '
+                    f'WHERE key IN ({marks})',
+                    chunk
+                ).fetchone()[0]
+                cursor.execute(
+                    f'DELETE FROM cache WHERE key IN ({marks})', chunk
+                )
+                cursor.execute(
+                    'UPDATE cache_size SET total = total - ? WHERE id = 1',
+                    (freed,)
+                )
+
+    def clear(self):
+        with self._write() as cursor:
+            cursor.execute('DELETE FROM cache')
+            cursor.execute('UPDATE cache_size SET total = 0 WHERE id = 1')
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время потока: открывать его заново дорого.
+        pass
+
+
+class _WriteTransaction:
+    """BEGIN IMMEDIATE сразу берёт блокировку записи и исключает гонки."""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __enter__(self):
+        cursor = self._connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        return cursor
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self._connection.execute('COMMIT')
+        else:
+            self._connection.execute('ROLLBACK')
+
+
+class TwoLevelCache(BaseCache):
+    """Кеш процесса (L1) перед общим кешем (L2).
+
+    L1 - ограниченный LRU с коротким сроком жизни записей. Об изменениях
+    процессы узнают через файл LOCATION, отображённый в память: в нём
+    лежат счётчики версий, и ключ привязан к одному из них по хешу.
+    Запись в L2 увеличивает счётчик ключа, а чтение из L1 сверяет его
+    без обращения к L2 и без системных вызовов, так что L1 не отдаёт
+    значение старше последней записи. Значения из L1 отдаются без
+    копирования, их нельзя менять.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options.get('L2', 'shared')
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._stamps = _VersionStamps(
+            location, int(options.get('STAMP_SLOTS', 4096))
+        )
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def _l2(self):
+        return caches[self._l2_alias]
+
+    def _slot(self, key, version):
+        return zlib.crc32(self.make_key(key, version).encode())
+
+    def _l1_get(self, key, version):
+        entry = self._l1.get((key, version))
+        if entry is None:
+            return _MISSING
+        value, expires, slot, stamp = entry
+        if expires < time.monotonic() or self._stamps.read(slot) != stamp:
+            self._l1_forget([(key, version)])
+            return _MISSING
+        with self._lock:
+            if (key, version) in self._l1:
+                self._l1.move_to_end((key, version))
+        return value
+
+    def _l1_put(self, key, version, value, slot, stamp):
+        with self._lock:
+            self._l1[(key, version)] = (
+                value, time.monotonic() + self._l1_timeout, slot, stamp
+            )
+            self._l1.move_to_end((key, version))
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_forget(self, keys):
+        with self._lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
+    def _changed(self, keys, version):
+        """Сообщает всем процессам, что ключи keys изменились в L2."""
+        self._l1_forget([(key, version) for key in keys])
+        self._stamps.bump(self._slot(key, version) for key in keys)
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = {}
+        for key in keys:
+            value = self._l1_get(key, version)
+            if value is _MISSING:
+                slot = self._slot(key, version)
+                # Версию читаем до L2: запись, случившаяся после чтения,
+                # изменит её, и запись L1 станет недействительной.
+                missing[key] = (slot, self._stamps.read(slot))
+            else:
+                found[key] = value
+        if missing:
+            fetched = self._l2.get_many(list(missing), version=version)
+            for key, value in fetched.items():
+                self._l1_put(key, version, value, *missing[key])
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        return self._l1_get(key, version) is not _MISSING or (
+            self._l2.has_key(key, version=version)
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._l2.set_many(
+            data, self._l2_timeout(timeout), version=version
+        )
+        self._changed(data, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._l2.add(
+            key, value, self._l2_timeout(timeout), version=version
+        )
+        if added:
+            self._changed([key], version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._l2.touch(key, self._l2_timeout(timeout), version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self._l2.incr(key, delta, version=version)
+        self._changed([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._l2.delete_many(keys, version=version)
+        self._changed(keys, version)
+
+    def clear(self):
+        self._l2.clear()
+        with self._lock:
+            self._l1.clear()
+        self._stamps.bump_all()
+
+    def _l2_timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+
+class _VersionStamps:
+    """Счётчики версий в файле, общем для процессов машины."""
+
+    def __init__(self, path, slots):
+        self._path = path
+        self._slots = slots
+        self._mmap = None
+        self._fd = None
+
+    def _open(self):
+        if self._mmap is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+            size = self._slots * STAMP.size
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+            self._fd = fd
+        return self._mmap
+
+    def read(self, slot):
+        return STAMP.unpack_from(
+            self._open(), (slot % self._slots) * STAMP.size
+        )[0]
+
+    def bump(self, slots):
+        stamps = self._open()
+        offsets = {(slot % self._slots) * STAMP.size for slot in slots}
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            for offset in offsets:
+                value = STAMP.unpack_from(stamps, offset)[0]
+                STAMP.pack_into(stamps, offset, (value + 1) % 2 ** 64)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def bump_all(self):
+        self.bump(range(self._slots))
@@ -0,0 +1,39 @@
+import re
+
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.html import escape
+
+HOLE_RE = re.compile(r'<!--donut:([\w/.\-]+)-->')
+
+
+def hole_marker(template_name):
+    return f'<!--donut:{escape(template_name)}-->'
+
+
+def start_shell(request):
+    """Дальше страница рендерится без частей, зависящих от пользователя."""
+    request.donut_shell = True
+
+
+def is_shell(request):
+    return getattr(request, 'donut_shell', False)
+
+
+def fill_holes(request, response, context):
+    """Рендерит части страницы, помеченные тегом donut, для запроса.
+
+    Сам response не меняется: он может лежать в кеше.
+    """
+    content = response.content.decode(response.charset)
+    content = HOLE_RE.sub(
+        lambda match: render_to_string(
+            match.group(1), context, request=request
+        ),
+        content
+    )
+    return HttpResponse(
+        content,
+        content_type=response['Content-Type'],
+        status=response.status_code
+    )
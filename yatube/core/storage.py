@@ -0,0 +1,55 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище с именами по SHA-256 содержимого.
+
+    Файл попадает в подкаталоги ab/cd/ из первых символов хеша, каталог
+    из upload_to остаётся префиксом. Одинаковые файлы записываются
+    один раз и получают одно и то же имя.
+    """
+
+    content_name_re = re.compile(
+        r'(?:^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(?:\.\w+)?$'
+    )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        try:
+            return self._save(name, content).replace('\\', '/')
+        except FileExistsError:
+            # Тот же файл только что записал другой процесс.
+            return name
+
+    def get_available_name(self, name, max_length=None):
+        # Занятое имя значит, что файл с таким содержимым уже сохранён.
+        raise FileExistsError(name)
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return '/'.join(filter(None, (
+            directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension
+        )))
+
+    def is_content_name(self, name):
+        """Получено ли имя файла из его содержимого."""
+        return bool(self.content_name_re.search(name or ''))
@@ -0,0 +1,39 @@
+"""Запуск тестов с отдельным временным кешем."""
+import copy
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def temporary_cache():
+    """Переносит файлы кеша из CACHE_PATH во временный каталог.
+
+    Тесты очищают кеш, поэтому не должны работать с кешем сервера.
+    """
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    path = f'{directory}/cache.sqlite3'
+    caches = copy.deepcopy(settings.CACHES)
+    for config in caches.values():
+        location = config.get('LOCATION', '')
+        config['LOCATION'] = location.replace(settings.CACHE_PATH, path)
+    try:
+        with override_settings(CACHES=caches, CACHE_PATH=path):
+            yield path
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        self._temporary_cache = temporary_cache()
+        self._temporary_cache.__enter__()
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self._temporary_cache.__exit__(None, None, None)
@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import time
+
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from .cache_backends import SQLiteCache, TwoLevelCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_between_instances(self):
+        """Записи видны другому экземпляру, открывшему тот же файл."""
+        self.cache.set('key', {'value': [1, 2]})
+        self.cache.set_many({'a': 1, 'b': 'два'})
+        other = self.make_cache()
+        self.assertEqual(other.get('key'), {'value': [1, 2]})
+        self.assertEqual(other.get_many(['a', 'b', 'c']), {'a': 1, 'b': 'два'})
+
+    def test_add_incr_and_expiry(self):
+        """add не затирает живую запись, incr атомарно меняет число."""
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 10), 11)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('short', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 'new'))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """При переполнении вытесняются давно не читанные записи."""
+        cache = self.make_cache(MAX_SIZE=3000, TOUCH_INTERVAL=0)
+        cache.set('old', 'x' * 1000)
+        cache.set('used', 'x' * 1000)
+        cache.get('used')
+        cache.set('new', 'x' * 1000)
+        self.assertIsNone(cache.get('old'))
+        self.assertIsNotNone(cache.get('used'))
+        self.assertIsNotNone(cache.get('new'))
+
+    def test_delete_and_clear(self):
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.cache.delete('a')
+        self.cache.delete_many(['b'])
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'c': 3})
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('c'))
+
+
+class TwoLevelCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'l2': {
+                'BACKEND': 'core.cache_backends.SQLiteCache',
+                'LOCATION': os.path.join(self.directory, 'cache.sqlite3'),
+            },
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.worker_1 = self.make_cache()
+        self.worker_2 = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self):
+        return TwoLevelCache(
+            os.path.join(self.directory, 'cache.stamps'),
+            {'OPTIONS': {'L2': 'l2', 'L1_TIMEOUT': 60}}
+        )
+
+    def test_repeated_reads_are_served_from_l1(self):
+        """Повторное чтение не обращается к общему кешу."""
+        self.worker_1.set('key', 'value')
+        self.assertEqual(self.worker_1.get('key'), 'value')
+        with mock.patch.object(SQLiteCache, 'get_many') as l2_get_many:
+            self.assertEqual(self.worker_1.get('key'), 'value')
+            self.assertEqual(self.worker_1.get_many(['key']), {'key': 'value'})
+        l2_get_many.assert_not_called()
+
+    def test_writes_invalidate_l1_of_other_workers(self):
+        """Запись одного процесса сразу видна в L1 другого."""
+        self.worker_1.set('generation', 1)
+        self.assertEqual(self.worker_2.get('generation'), 1)
+        self.worker_1.incr('generation')
+        self.assertEqual(self.worker_2.get('generation'), 2)
+        self.worker_1.delete('generation')
+        self.assertIsNone(self.worker_2.get('generation'))
+
+
+class CacheSettingsTest(SimpleTestCase):
+    def test_tests_use_temporary_cache(self):
+        """Тесты не трогают файл кеша сервера."""
+        self.assertFalse(settings.CACHE_PATH.startswith(settings.BASE_DIR))
+        for config in settings.CACHES.values():
+            self.assertFalse(config['LOCATION'].startswith(settings.BASE_DIR))
@@ -2,6 +2,7 @@ from django.contrib import admin
 
 
 from .models import Post, Group
+from .search import match_expression, matching_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,6 +12,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).feed()
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по индексу FTS5 вместо LIKE '%...%' по всей таблице.
+        expression = match_expression(search_term)
+        if not expression:
+            return queryset, False
+        return queryset.filter(pk__in=matching_ids(expression)), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title', 'slug', 'description')
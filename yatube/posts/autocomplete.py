@@ -0,0 +1,315 @@
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.urls import reverse
+
+from .caching import get_or_compute
+from .models import Group, Tag, User
+
+USER, GROUP, TAG = 'user', 'group', 'tag'
+# Символ в начале запроса оставляет подсказки одного вида
+KIND_MARKS = {'@': USER, '#': TAG}
+SUGGESTIONS_LIMIT = 10
+# Лучшие подсказки для префиксов не длиннее этого считаются заранее:
+# им подходит слишком много записей, чтобы выбирать при запросе
+TOP_PREFIX_LENGTH = 2
+# Отставший дальше процесс не читает журнал, а загружает снимок
+MAX_CHANGES = 1000
+
+VERSION_KEY = 'autocomplete:version'
+SNAPSHOT_KEY = 'autocomplete:snapshot'
+
+
+def change_key(version):
+    return f'autocomplete:change:{version}'
+
+
+def normalize(text):
+    return text.strip().lower().replace('ё', 'е')
+
+
+def words(*texts):
+    terms = set()
+    for text in texts:
+        text = normalize(text)
+        if text:
+            terms.add(text)
+            terms.update(text.split())
+    return tuple(sorted(terms))
+
+
+def user_entry(user):
+    label = user.get_full_name() or user.username
+    return (
+        user.username, label,
+        words(user.username, user.first_name, user.last_name)
+    )
+
+
+def group_entry(group):
+    return group.slug, group.title, words(group.slug, group.title)
+
+
+def tag_entry(name):
+    return name, f'#{name}', (name,)
+
+
+class PrefixIndex:
+    """Подсказки по префиксу в памяти процесса.
+
+    entries: ключ (вид, id) -> [значение, подпись, термы, популярность].
+    Термы всех записей лежат в отсортированном списке, и записи с
+    префиксом находятся двоичным поиском.
+    """
+
+    def __init__(self, entries, version):
+        # Снимок мог прийти из кеша процесса, его нельзя менять.
+        self.entries = {key: list(entry) for key, entry in entries.items()}
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.terms = sorted(
+            (term, key)
+            for key, entry in self.entries.items() for term in entry[2]
+        )
+        self.top = {}
+        for prefix in self._prefixes(term for term, _ in self.terms):
+            self._rescan_top(prefix)
+
+    @staticmethod
+    def _prefixes(terms):
+        return {
+            term[:length] for term in terms
+            for length in range(1, min(len(term), TOP_PREFIX_LENGTH) + 1)
+        }
+
+    def _matches(self, prefix):
+        i = bisect.bisect_left(self.terms, (prefix,))
+        while i < len(self.terms) and self.terms[i][0].startswith(prefix):
+            yield self.terms[i][1]
+            i += 1
+
+    def _best(self, keys, kind=None):
+        # dict сохраняет алфавитный порядок термов для равной популярности.
+        keys = dict.fromkeys(
+            key for key in keys if kind is None or key[0] == kind
+        )
+        return heapq.nlargest(
+            SUGGESTIONS_LIMIT, keys, key=lambda key: self.entries[key][3]
+        )
+
+    def _rescan_top(self, prefix):
+        best = self._best(self._matches(prefix))
+        if best:
+            self.top[prefix] = best
+        else:
+            self.top.pop(prefix, None)
+
+    def _raise_in_top(self, key):
+        for prefix in self._prefixes(self.entries[key][2]):
+            self.top[prefix] = self._best([*self.top.get(prefix, ()), key])
+
+    def search(self, query):
+        query = normalize(query)
+        kind = KIND_MARKS.get(query[:1])
+        if kind:
+            query = query[1:]
+        if not query:
+            return []
+        if kind is None and len(query) <= TOP_PREFIX_LENGTH:
+            keys = self.top.get(query, [])
+        else:
+            keys = self._best(self._matches(query), kind)
+        return [(key, self.entries[key]) for key in keys]
+
+    def put(self, key, value, label, terms, score=0):
+        old = self.entries.get(key)
+        if old:
+            score = old[3]
+            self._drop_terms(key, old[2])
+        self.entries[key] = [value, label, terms, score]
+        for term in terms:
+            bisect.insort(self.terms, (term, key))
+        for prefix in self._prefixes([*terms, *(old[2] if old else ())]):
+            self._rescan_top(prefix)
+
+    def remove(self, key):
+        old = self.entries.pop(key, None)
+        if old:
+            self._drop_terms(key, old[2])
+            for prefix in self._prefixes(old[2]):
+                self._rescan_top(prefix)
+
+    def change_score(self, key, delta):
+        if key not in self.entries:
+            if key[0] != TAG or delta <= 0:
+                return
+            self.put(key, *tag_entry(key[1]))
+        entry = self.entries[key]
+        entry[3] += delta
+        if key[0] == TAG and entry[3] <= 0:
+            self.remove(key)
+        elif delta > 0:
+            self._raise_in_top(key)
+        else:
+            for prefix in self._prefixes(entry[2]):
+                if key in self.top.get(prefix, ()):
+                    self._rescan_top(prefix)
+
+    def _drop_terms(self, key, terms):
+        for term in terms:
+            i = bisect.bisect_left(self.terms, (term, key))
+            if i < len(self.terms) and self.terms[i] == (term, key):
+                del self.terms[i]
+
+    def apply(self, change):
+        operation, *args = change
+        getattr(self, operation)(*args)
+
+
+def build_snapshot():
+    """Записи индекса из базы и номер журнала, с которого они верны.
+
+    Номер читается до запросов, поэтому изменения, попавшие в базу во
+    время сборки, применятся ещё раз. Популярность при этом ненадолго
+    завышается на единицы, до следующей сборки.
+    """
+    cache.add(VERSION_KEY, 0, None)
+    version = cache.get(VERSION_KEY, 0)
+    entries = {}
+    users = User.objects.select_related('stats').only(
+        'username', 'first_name', 'last_name', 'stats__follower_count'
+    )
+    for user in users.iterator():
+        stats = getattr(user, 'stats', None)
+        entries[(USER, user.pk)] = (
+            *user_entry(user), stats.follower_count if stats else 0
+        )
+    groups = Group.objects.annotate(post_count=Count('posts')).defer(
+        'description'
+    )
+    for group in groups:
+        entries[(GROUP, group.pk)] = (*group_entry(group), group.post_count)
+    tags = Tag.objects.filter(post_count__gt=0).values_list(
+        'name', 'post_count'
+    )
+    for name, count in tags.iterator(chunk_size=settings.FEED_BATCH_SIZE):
+        entries[(TAG, name)] = (*tag_entry(name), count)
+    return entries, version
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _catch_up(index, version):
+    """Применяет к index журнал до version; False, если он неполон."""
+    if version is None or index.version > version:
+        return False
+    if version - index.version > MAX_CHANGES:
+        return False
+    keys = [change_key(n) for n in range(index.version + 1, version + 1)]
+    changes = cache.get_many(keys)
+    for i, key in enumerate(keys):
+        if key not in changes:
+            # Номер выдаётся до записи изменения: пропуск в конце журнала
+            # дозапишется, пропуск в середине значит, что запись потеряна.
+            return not any(later in changes for later in keys[i:])
+        index.apply(changes[key])
+        index.version += 1
+    return True
+
+
+def get_index():
+    """Индекс процесса, догнавший общий журнал изменений.
+
+    Обычно это одно чтение номера журнала из кеша процесса. Процесс,
+    отставший от журнала или державший индекс дольше срока снимка,
+    загружает снимок из кеша; истёкший снимок собирает из базы один
+    процесс.
+    """
+    global _index
+    with _index_lock:
+        version = cache.get(VERSION_KEY)
+        index = _index
+        if index is not None:
+            age = time.monotonic() - index.loaded_at
+            if age < settings.AUTOCOMPLETE_SNAPSHOT_TIMEOUT and _catch_up(
+                index, version
+            ):
+                return index
+        index = _load_snapshot()
+        if not _catch_up(index, cache.get(VERSION_KEY)):
+            # Журнал после снимка потерян: снимок собирается заново.
+            cache.delete(SNAPSHOT_KEY)
+            index = _load_snapshot()
+            _catch_up(index, cache.get(VERSION_KEY))
+        _index = index
+        return index
+
+
+def _load_snapshot():
+    return PrefixIndex(*get_or_compute(
+        SNAPSHOT_KEY, build_snapshot, settings.AUTOCOMPLETE_SNAPSHOT_TIMEOUT
+    ))
+
+
+def record_change(*change):
+    """Добавляет изменение индекса в журнал, общий для процессов."""
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        # Индекс ещё не собирался: изменение попадёт в него из базы.
+        return
+    cache.set(
+        change_key(version), change, settings.AUTOCOMPLETE_CHANGE_TIMEOUT
+    )
+
+
+def user_changed(user):
+    record_change('put', (USER, user.pk), *user_entry(user))
+
+
+def group_changed(group):
+    record_change('put', (GROUP, group.pk), *group_entry(group))
+
+
+def entry_removed(kind, pk):
+    record_change('remove', (kind, pk))
+
+
+def change_score(kind, pk, delta):
+    record_change('change_score', (kind, pk), delta)
+
+
+def change_tags(added, removed):
+    """Популярность хештегов, добавленных в пост и убранных из него."""
+    for name in sorted(added):
+        change_score(TAG, name, 1)
+    for name in sorted(removed):
+        change_score(TAG, name, -1)
+
+
+def suggestion_url(kind, value):
+    if kind == USER:
+        return reverse('posts:profile', args=[value])
+    if kind == GROUP:
+        return reverse('posts:group_list', args=[value])
+    return reverse('posts:tag_posts', args=[value])
+
+
+def suggest(query):
+    """Подсказки для строки query, самые популярные первыми."""
+    return [
+        {
+            'type': kind,
+            'value': value,
+            'label': label,
+            'url': suggestion_url(kind, value),
+        }
+        for (kind, _), (value, label, _, _) in get_index().search(query)
+    ]
@@ -0,0 +1,13 @@
+def pk_batches(queryset, batch_size):
+    """Пачки объектов queryset не больше batch_size по возрастанию pk.
+
+    Следующая пачка выбирается диапазоном pk после предыдущей: в памяти
+    только одна пачка, а объекты, которые обработка оставила в
+    queryset (например, с нечитаемыми картинками), не выбираются
+    повторно.
+    """
+    queryset = queryset.order_by('pk')
+    batch = list(queryset[:batch_size])
+    while batch:
+        yield batch
+        batch = list(queryset.filter(pk__gt=batch[-1].pk)[:batch_size])
@@ -0,0 +1,296 @@
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.http import http_date, quote_etag
+
+from core.donut import fill_holes, start_shell
+from .thumbnails import prefetch_thumbnails
+
+GLOBAL_FEED = 'index'
+GROUPS_FEED = 'groups'
+# Имена пользователей выводятся на всех страницах лент
+USERS_FEED = 'users'
+RYW_SESSION_KEY = 'feed_cache_bypass_until'
+
+
+def group_feed(slug):
+    return f'group:{slug}'
+
+
+def author_feed(username):
+    return f'author:{username}'
+
+
+def tag_feed(name):
+    return f'tag:{name}'
+
+
+def mention_feed(username):
+    return f'mention:{username}'
+
+
+def post_feed(post_id):
+    return f'post:{post_id}'
+
+
+def user_feed(user_id):
+    return f'user:{user_id}'
+
+
+def page_feeds(feeds, kwargs):
+    return [GROUPS_FEED, USERS_FEED, *feeds(**kwargs)]
+
+
+def _generation_key(feed):
+    return f'feed_generation:{feed}'
+
+
+def get_generations(feeds):
+    """Возвращает текущие поколения лент одним обращением к кешу."""
+    keys = [_generation_key(feed) for feed in feeds]
+    found = cache.get_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in found}
+    for key, value in missing.items():
+        # add() не затрёт поколение, записанное параллельно.
+        if not cache.add(key, value, None):
+            value = cache.get(key, value)
+        found[key] = value
+    return [found[key] for key in keys]
+
+
+def bump_generations(*feeds):
+    """Делает устаревшими все страницы, закешированные для лент feeds."""
+    generation = _new_generation()
+    cache.set_many(
+        {_generation_key(feed): generation for feed in feeds}, None
+    )
+
+
+def _new_generation():
+    # Время записи в наносекундах служит и Last-Modified страниц ленты.
+    # Случайные младшие разряды различают записи в одну микросекунду.
+    return int(time.time() * 10 ** 6) * 1000 + random.randrange(1000)
+
+
+def generation_time(generation):
+    return datetime.fromtimestamp(generation / 10 ** 9, timezone.utc)
+
+
+def allow_stale_reads(request):
+    """Разрешает ли сессия читать страницы лент из кеша."""
+    bypass_until = request.session.get(RYW_SESSION_KEY)
+    return bypass_until is None or bypass_until < time.time()
+
+
+def mark_written(request):
+    """Автор увидит свои изменения в обход кеша в ближайшие секунды."""
+    request.session[RYW_SESSION_KEY] = (
+        time.time() + settings.FEED_CACHE_RYW_SECONDS
+    )
+
+
+def page_cache_key(request, view_name, generations):
+    generations = '.'.join(str(gen) for gen in generations)
+    return f'feed_page:{view_name}:{generations}:{page_identity(request)}'
+
+
+def stale_page_cache_key(request, view_name):
+    return f'feed_page_stale:{view_name}:{page_identity(request)}'
+
+
+def page_identity(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def _recompute_early(expires_at, delta):
+    """Вероятностный пересчёт до истечения записи (XFetch).
+
+    Чем дольше считалась запись и чем ближе её срок, тем выше шанс,
+    что один из запросов пересчитает её заранее.
+    """
+    gap = -delta * settings.FEED_CACHE_EARLY_BETA * math.log(
+        1 - random.random()
+    )
+    return time.time() + gap >= expires_at
+
+
+def _compute_and_store(key, compute, timeout, stale_key, cacheable):
+    started = time.time()
+    value = compute()
+    if cacheable(value):
+        delta = time.time() - started
+        entry = (value, time.time() + timeout, delta)
+        cache.set(key, entry, timeout)
+        if stale_key:
+            cache.set(stale_key, entry, timeout * 2)
+    return value
+
+
+def get_or_compute(key, compute, timeout, stale_key=None,
+                   cacheable=lambda value: True):
+    """Читает значение из кеша, вычисляя его одним процессом.
+
+    Промах вычисляет только процесс, взявший блокировку; остальные
+    отдают устаревшую копию из stale_key или ждут результата не дольше
+    FEED_CACHE_LOCK_WAIT. Незадолго до истечения значение пересчитывается
+    заранее, пока остальные продолжают читать текущее.
+    """
+    lock_key = f'lock:{key}'
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires_at, delta = entry
+        if not _recompute_early(expires_at, delta):
+            return value
+        if not cache.add(lock_key, 1, settings.FEED_CACHE_LOCK_TIMEOUT):
+            return value
+    elif not cache.add(lock_key, 1, settings.FEED_CACHE_LOCK_TIMEOUT):
+        stale = cache.get(stale_key) if stale_key else None
+        if stale is not None:
+            return stale[0]
+        deadline = time.time() + settings.FEED_CACHE_LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(settings.FEED_CACHE_LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[0]
+        return compute()
+    try:
+        return _compute_and_store(key, compute, timeout, stale_key, cacheable)
+    finally:
+        cache.delete(lock_key)
+
+
+def cache_feed(feeds, holes=None):
+    """Кеширует страницу ленты до изменения её поколения.
+
+    feeds получает именованные аргументы представления и возвращает
+    имена лент, от которых зависит страница. К ним всегда добавляются
+    ленты групп и пользователей. Пока один процесс пересобирает
+    страницу, остальные отдают её предыдущую версию.
+
+    Страница собирается одна на всех пользователей: части, выведенные
+    тегом donut, заполняются при каждом запросе с контекстом из holes.
+
+    ETag и Last-Modified ответа считаются из поколений, с которыми
+    собрана отданная страница: устаревшая копия получает старые
+    валидаторы, и клиент не закрепит её ответом 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            start_shell(request)
+            view_name = view.__name__
+            generations = get_generations(page_feeds(feeds, kwargs))
+
+            def compute():
+                response = view(request, *args, **kwargs)
+                response.feed_generations = generations
+                return response
+
+            if request.method != 'GET' or not allow_stale_reads(request):
+                response = compute()
+            else:
+                response = get_or_compute(
+                    page_cache_key(request, view_name, generations),
+                    compute,
+                    settings.FEED_CACHE_TIMEOUT,
+                    stale_key=stale_page_cache_key(request, view_name),
+                    cacheable=lambda response: response.status_code == 200,
+                )
+            context = holes(request, **kwargs) if holes else {}
+            page = fill_holes(request, response, context)
+            if request.method in ('GET', 'HEAD') and page.status_code == 200:
+                etag, last_modified = feed_validators(
+                    request, response.feed_generations
+                )
+                page['ETag'] = quote_etag(etag)
+                page['Last-Modified'] = http_date(last_modified.timestamp())
+            return page
+        return wrapper
+    return decorator
+
+
+def feed_validators(request, generations):
+    """ETag и Last-Modified страницы, собранной с поколениями generations.
+
+    Поколения меняются при любой записи в ленту, поэтому валидаторы
+    проверяются без запросов к базе.
+    """
+    user = request.user.pk if request.user.is_authenticated else 'anon'
+    raw = f'{generations}:{user}:{request.get_full_path()}'
+    etag = hashlib.md5(raw.encode()).hexdigest()
+    return etag, generation_time(max(generations))
+
+
+def feed_etag(feeds):
+    """ETag текущей версии страницы ленты для условного GET."""
+    def etag(request, *args, **kwargs):
+        generations = get_generations(page_feeds(feeds, kwargs))
+        return feed_validators(request, generations)[0]
+    return etag
+
+
+def feed_last_modified(feeds):
+    """Last-Modified текущей версии страницы: время записи в её ленты."""
+    def last_modified(request, *args, **kwargs):
+        generations = get_generations(page_feeds(feeds, kwargs))
+        return feed_validators(request, generations)[1]
+    return last_modified
+
+
+def card_generations(posts):
+    """Поколения ленты групп и лент авторов, выведенных в карточках."""
+    feeds = [GROUPS_FEED, *{user_feed(post.author_id) for post in posts}]
+    return dict(zip(feeds, get_generations(feeds)))
+
+
+def post_card_key(post, variant, generations):
+    return (
+        f'post_card:{post.pk}:{post.updated.timestamp()}:'
+        f'{post.comment_count}:{variant}:'
+        f'{generations[GROUPS_FEED]}.'
+        f'{generations[user_feed(post.author_id)]}'
+    )
+
+
+def render_post_cards(posts, show_author=True, show_group=True):
+    """Возвращает HTML карточек постов, по возможности из кеша.
+
+    Ключ карточки включает время изменения поста, число комментариев,
+    поколение ленты групп и поколение автора, поэтому правка поста или
+    новый комментарий делают устаревшей только его карточку, а смена
+    имени автора - только карточки автора. Закешированная страница
+    ленты показывает число комментариев до следующей записи в ленту.
+    Поколения, кеш карточек и миниатюры недостающих карточек читаются
+    одним обращением на страницу каждое.
+    """
+    posts = list(posts)
+    variant = f'{int(show_author)}{int(show_group)}'
+    generations = card_generations(posts)
+    keys = [post_card_key(post, variant, generations) for post in posts]
+    cards = cache.get_many(keys)
+    prefetch_thumbnails(
+        post for post, key in zip(posts, keys) if key not in cards
+    )
+    missing = {}
+    for post, key in zip(posts, keys):
+        if key not in cards:
+            missing[key] = render_to_string(
+                'posts/includes/post_card.html',
+                {
+                    'post': post,
+                    'show_author': show_author,
+                    'show_group': show_group,
+                }
+            )
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [cards[key] for key in keys]
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .feed import mark_celebrities
+from .models import (Comment, Follow, MediaFile, Post, PostTag, Tag, User,
+                     UserStats)
+
+
+def increment_stats(user_id, **deltas):
+    """Атомарно меняет счётчики пользователя, создавая строку при нужде."""
+    values = {field: F(field) + delta for field, delta in deltas.items()}
+    if not UserStats.objects.filter(user_id=user_id).update(**values):
+        UserStats.objects.get_or_create(user_id=user_id)
+        UserStats.objects.filter(user_id=user_id).update(**values)
+
+
+def decrement_stats(user_id, *fields):
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) - 1 for field in fields}
+    )
+
+
+def change_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+def acquire_file(name, count=1):
+    """Добавляет ссылки на файл хранилища."""
+    with transaction.atomic():
+        if not MediaFile.objects.filter(name=name).update(
+            ref_count=F('ref_count') + count
+        ):
+            MediaFile.objects.create(name=name, ref_count=count)
+
+
+def release_file(storage, name):
+    """Снимает ссылку на файл; файл без ссылок удаляется из storage.
+
+    Файл удаляется после фиксации транзакции, чтобы откат не оставил
+    ссылку на удалённый файл.
+    """
+    with transaction.atomic():
+        MediaFile.objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F('ref_count') - 1
+        )
+        deleted, _ = MediaFile.objects.filter(
+            name=name, ref_count=0
+        ).delete()
+        if deleted:
+            transaction.on_commit(lambda: storage.delete(name))
+
+
+def change_file_refs(storage, old_name, new_name):
+    """Переносит ссылку поста со старого файла на новый.
+
+    Учитываются только файлы с именами по содержимому: их может
+    делить несколько постов.
+    """
+    if storage.is_content_name(new_name):
+        acquire_file(new_name)
+    if storage.is_content_name(old_name):
+        release_file(storage, old_name)
+
+
+def _count(queryset, field):
+    """Подзапрос с числом строк queryset, сгруппированных по field."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def recount_stats():
+    """Пересчитывает все счётчики по исходным таблицам."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    )
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in missing.iterator()),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    UserStats.objects.update(
+        post_count=_count(Post.objects.all(), 'author'),
+        follower_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+    mark_celebrities()
+    Post.objects.update(comment_count=_count(Comment.objects.all(), 'post'))
+    recount_tags()
+
+
+def recount_tags():
+    Tag.objects.update(post_count=_count(PostTag.objects.all(), 'tag'))
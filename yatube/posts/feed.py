@@ -0,0 +1,139 @@
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+from .models import FEED_DEFERRED_FIELDS, FeedEntry, Follow, Post, UserStats
+from .paginators import KeysetPaginator
+
+
+class FeedEntryPaginator(KeysetPaginator):
+    """Страницы постов, выбранные одним диапазоном из таблицы ссылок.
+
+    Подходит для FeedEntry, PostTag и Mention: у всех есть пост и его дата.
+    """
+
+    keys = ('pub_date', 'post_id')
+
+    def fetch(self, queryset):
+        queryset = queryset.select_related(
+            'post__author', 'post__group'
+        ).defer(*(f'post__{field}' for field in FEED_DEFERRED_FIELDS))
+        return [entry.post for entry in queryset]
+
+
+class MergedFeedPaginator(KeysetPaginator):
+    """Страницы нескольких лент постов, слитых по ключу (pub_date, id).
+
+    object_list - пары (queryset, класс пагинатора). Каждая лента
+    читается своим диапазоном индекса, а страница собирается слиянием
+    их начал. Пост, попавший в несколько лент, выводится один раз.
+    """
+
+    def __init__(self, object_list, per_page, **kwargs):
+        Paginator.__init__(self, object_list, per_page, **kwargs)
+        self.parts = [
+            paginator_class(queryset, per_page)
+            for queryset, paginator_class in object_list
+        ]
+        self._num_pages = 1
+
+    def select(self, stop, start=0, key=None, reverse=False):
+        # Первые stop постов всех лент вместе лежат среди первых stop
+        # постов каждой из них.
+        rows = merge(
+            *(part.select(stop, key=key, reverse=reverse)
+              for part in self.parts),
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=not reverse
+        )
+        return list(islice(unique_posts(rows), start, stop))
+
+
+def unique_posts(posts):
+    """Посты без повторов: повторы после слияния идут подряд."""
+    previous = None
+    for post in posts:
+        if post.pk != previous:
+            previous = post.pk
+            yield post
+
+
+def celebrity_ids(author_ids):
+    """Авторы, чьи посты не раскладываются по лентам подписчиков."""
+    return list(UserStats.objects.filter(
+        Q(follower_count__gt=settings.FEED_FANOUT_LIMIT) | Q(celebrity=True),
+        user_id__in=author_ids
+    ).values_list('user_id', flat=True))
+
+
+def mark_celebrities(**filters):
+    """Отмечает авторов, перешедших FEED_FANOUT_LIMIT, среди filters."""
+    UserStats.objects.filter(
+        follower_count__gt=settings.FEED_FANOUT_LIMIT,
+        celebrity=False,
+        **filters
+    ).update(celebrity=True)
+
+
+def fan_out_post(post):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    if celebrity_ids([post.author_id]):
+        return
+    follower_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in follower_ids.iterator()),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill_follow(follow):
+    """Заполняет ленту нового подписчика постами автора."""
+    if celebrity_ids([follow.author_id]):
+        return
+    posts = Post.objects.filter(
+        author_id=follow.author_id
+    ).values_list('pk', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=follow.user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts.iterator()),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def prune_follow(follow):
+    """Убирает из ленты посты автора, от которого отписались."""
+    FeedEntry.objects.filter(
+        user_id=follow.user_id,
+        post__author_id=follow.author_id
+    ).delete()
+
+
+def follow_feed(user):
+    """Возвращает ленту подписок пользователя и класс её пагинатора.
+
+    Обычно лента читается из FeedEntry. Посты авторов с числом
+    подписчиков больше FEED_FANOUT_LIMIT не раскладываются при записи
+    и подмешиваются к ленте при чтении: посты каждого такого автора
+    читаются своим диапазоном индекса. Автор остаётся таким и после
+    отписок: его посты тех времён есть не во всех лентах.
+    """
+    author_ids = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    )
+    entries = FeedEntry.objects.filter(user=user)
+    celebrities = celebrity_ids(author_ids)
+    if not celebrities:
+        return entries, FeedEntryPaginator
+    parts = [(entries, FeedEntryPaginator)] + [
+        (Post.objects.feed().filter(author_id=author_id), KeysetPaginator)
+        for author_id in sorted(celebrities)
+    ]
+    return parts, MergedFeedPaginator
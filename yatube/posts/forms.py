@@ -7,6 +7,21 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ['text', 'group', 'image']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Причину отказа ImageUploadHandler форма показывает как ошибку
+        # поля, а сам пустой файл не проверяет.
+        image = self.files.get('image')
+        self.upload_error = getattr(image, 'upload_error', None)
+        if self.upload_error:
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        if self.upload_error:
+            raise forms.ValidationError(self.upload_error)
+        return self.cleaned_data['image']
+
     def clean_text(self):
         data = self.cleaned_data['text']
         if data == "":
@@ -0,0 +1,60 @@
+import hashlib
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 64 * 1024
+EMPTY_IMAGE_META = {
+    'image_width': None,
+    'image_height': None,
+    'image_color': '',
+    'image_hash': '',
+}
+
+
+def read_image_meta(file):
+    """Размеры, основной цвет и SHA-256 картинки из открытого файла."""
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    with Image.open(file) as image:
+        width, height = image.size
+        # Для JPEG декодируется уменьшенная копия: нужен только цвет.
+        image.draft('RGB', (64, 64))
+        red, green, blue = image.convert('RGB').resize(
+            (1, 1), Image.BOX
+        ).getpixel((0, 0))
+    file.seek(0)
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': f'#{red:02x}{green:02x}{blue:02x}',
+        'image_hash': digest.hexdigest(),
+    }
+
+
+def fill_image_meta(post):
+    """Заполняет поля image_* поста по его картинке.
+
+    Нечитаемая картинка оставляет поля пустыми, сохранение поста
+    из-за неё не прерывается.
+    """
+    meta = EMPTY_IMAGE_META
+    image = post.image
+    if image:
+        try:
+            image.open('rb')
+            meta = read_image_meta(image)
+        except (OSError, ValueError, SuspiciousFileOperation):
+            logger.warning('Не удалось прочитать картинку %s', image.name)
+        finally:
+            # Загруженный файл ещё понадобится при сохранении в хранилище.
+            if image._committed:
+                image.close()
+    for field, value in meta.items():
+        setattr(post, field, value)
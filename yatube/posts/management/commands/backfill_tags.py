@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.autocomplete import SNAPSHOT_KEY
+from posts.batches import pk_batches
+from posts.counters import recount_tags
+from posts.models import Post
+from posts.tags import backfill_posts
+
+
+class Command(BaseCommand):
+    help = (
+        'Извлекает хештеги и упоминания из постов, написанных до '
+        'появления их индекса, и пересчитывает число постов хештегов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько постов читать и индексировать за раз.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.only('pk', 'text', 'pub_date')
+        processed = 0
+        for batch in pk_batches(posts, options['batch_size']):
+            with transaction.atomic():
+                backfill_posts(batch)
+            processed += len(batch)
+        recount_tags()
+        # Подсказки соберут популярность хештегов заново из базы.
+        cache.delete(SNAPSHOT_KEY)
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано постов: {processed}.')
+        )
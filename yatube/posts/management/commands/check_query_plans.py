@@ -0,0 +1,152 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from posts import views
+from posts.caching import RYW_SESSION_KEY
+from posts.models import Comment, Follow, Mention, Post, PostTag
+from posts.paginators import CommentPaginator, KeysetPaginator
+from posts.search import SearchPaginator, match_expression, search_posts
+
+# Результаты поиска упорядочены по рангу BM25, который считается только
+# для найденных постов, поэтому их сортировка во временном B-дереве
+# неизбежна и не считается ошибкой.
+RANKED_PAGES = ('search', 'search after')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN QUERY PLAN для запросов страниц постов и '
+        'завершается ошибкой при полном сканировании таблицы или '
+        'сортировке во временном B-дереве.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда поддерживает только SQLite.')
+        post = Post.objects.order_by('pk').first()
+        if post is None:
+            raise CommandError('В базе нет постов для проверки.')
+        follow = Follow.objects.order_by('pk').first()
+        reader = follow.user if follow else post.author
+        cursor = KeysetPaginator.encode_cursor(2, post)
+        comment = Comment(pk=0, created=post.pub_date)
+        pages = (
+            ('index', views.index, reverse('posts:index'), {}),
+            ('index after', views.index, reverse('posts:index'),
+             {'after': cursor}),
+            ('index before', views.index, reverse('posts:index'),
+             {'before': cursor}),
+            ('profile', views.profile, reverse(
+                'posts:profile', args=[post.author.username]),
+             {}),
+            ('post_detail', views.post_detail, reverse(
+                'posts:post_detail', args=[post.pk]),
+             {}),
+            ('comment_list', views.comment_list, reverse(
+                'posts:comment_list', args=[post.pk]),
+             {'after': CommentPaginator.encode_cursor(1, comment)}),
+            ('follow_index', views.follow_index,
+             reverse('posts:follow_index'), {}),
+            ('follow_index after', views.follow_index,
+             reverse('posts:follow_index'), {'after': cursor}),
+        )
+        if follow:
+            # Порог 0 делает звёздами всех авторов ленты: их посты
+            # читаются мимо FeedEntry, каждый своим диапазоном.
+            celebrity_feed = override_settings(FEED_FANOUT_LIMIT=0)(
+                views.follow_index
+            )
+            pages += (
+                ('follow_index celebrity', celebrity_feed,
+                 reverse('posts:follow_index'), {}),
+                ('follow_index celebrity after', celebrity_feed,
+                 reverse('posts:follow_index'), {'after': cursor}),
+            )
+        pages += self.optional_pages(post)
+        problems = []
+        for name, view, url, params in pages:
+            user = reader if name.startswith('follow_index') else None
+            for sql in self.capture(view, url, params, user):
+                for detail in self.explain(sql):
+                    self.stdout.write(f'{name}: {detail}', ending='\n')
+                    if self.is_slow(detail, name in RANKED_PAGES):
+                        problems.append(f'{name}: {detail}\n    {sql}')
+        if problems:
+            raise CommandError(
+                'Найдены медленные планы запросов:\n' + '\n'.join(problems)
+            )
+        self.stdout.write(self.style.SUCCESS('Все планы запросов в порядке.'))
+
+    @staticmethod
+    def optional_pages(post):
+        """Страницы, которые есть не в каждой базе."""
+        pages = ()
+        if post.group:
+            pages += (
+                ('group_posts', views.group_posts, reverse(
+                    'posts:group_list', args=[post.group.slug]),
+                 {}),
+            )
+        post_tag = PostTag.objects.select_related('tag').first()
+        if post_tag:
+            pages += (
+                ('tag_posts', views.tag_posts, reverse(
+                    'posts:tag_posts', args=[post_tag.tag.name]),
+                 {}),
+            )
+        mention = Mention.objects.select_related('user').first()
+        if mention:
+            pages += (
+                ('mentions', views.mentions, reverse(
+                    'posts:mentions', args=[mention.user.username]),
+                 {}),
+            )
+        expression = match_expression(post.text)
+        if expression:
+            found = search_posts(Post.objects.all(), expression).get(
+                pk=post.pk
+            )
+            pages += (
+                ('search', views.search, reverse('posts:search'),
+                 {'q': post.text}),
+                ('search after', views.search, reverse('posts:search'),
+                 {'q': post.text,
+                  'after': SearchPaginator.encode_cursor(2, found)}),
+            )
+        return pages
+
+    def capture(self, view, url, params, user):
+        request = RequestFactory().get(url, params)
+        request.user = user or AnonymousUser()
+        # Отметка о свежей записи заставляет читать страницы мимо кеша.
+        request.session = {RYW_SESSION_KEY: float('inf')}
+        with CaptureQueriesContext(connection) as queries:
+            view(request, **resolve(request.path_info).kwargs)
+        return [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT')
+        ]
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    @staticmethod
+    def is_slow(detail, ranked=False):
+        words = detail.split()
+        if 'TEMP B-TREE' in detail:
+            return not (ranked and detail.endswith('FOR ORDER BY'))
+        # Индекс FTS5 выбирает строки по MATCH или rowid, а не перебором
+        if 'VIRTUAL TABLE INDEX' in detail:
+            return ':' not in words[-1] or words[-1].endswith(':')
+        return (
+            words[0] == 'SCAN'
+            and 'USING' not in words
+            and words[1] not in ('CONSTANT', 'SUBQUERY')
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from posts.batches import pk_batches
+from posts.images import EMPTY_IMAGE_META, fill_image_meta
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет размеры, основной цвет и хеш картинок постов, '
+        'загруженных до появления этих полей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько постов обновлять одним запросом.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').filter(
+            image_hash=''
+        ).only('pk', 'image')
+        filled = 0
+        for batch in pk_batches(posts, options['batch_size']):
+            for post in batch:
+                fill_image_meta(post)
+            Post.objects.bulk_update(batch, list(EMPTY_IMAGE_META))
+            filled += sum(1 for post in batch if post.image_hash)
+        self.stdout.write(
+            self.style.SUCCESS(f'Заполнены данные картинок: {filled}.')
+        )
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.thumbnails import process_thumbnail_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрабатывает очередь генерации миниатюр картинок постов. '
+        'Без --once работает, пока его не остановят.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выйти, когда в очереди не останется готовых задач.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.THUMBNAIL_JOB_BATCH_SIZE,
+            help='Сколько задач брать из очереди за раз.'
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            claimed = process_thumbnail_jobs(options['batch_size'])
+            processed += claimed
+            if claimed:
+                continue
+            if options['once']:
+                break
+            time.sleep(settings.THUMBNAIL_JOB_POLL)
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано задач: {processed}.')
+        )
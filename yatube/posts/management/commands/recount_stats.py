@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев, подписчиков '
+        'и подписок по исходным таблицам.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_stats()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
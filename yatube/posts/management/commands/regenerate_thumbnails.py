@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import render_thumbnails, store_thumbnails
+
+
+def render_job(item, force=False):
+    pk, image_name = item
+    try:
+        return pk, render_thumbnails(image_name, force), None
+    except Exception as error:
+        return pk, None, f'{image_name}: {error}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересоздаёт миниатюры всех картинок постов в пуле процессов. '
+        'После каждой пачки номер последнего поста сохраняется в файл, '
+        'и с --resume работа продолжается с него.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Число процессов; 1 - без пула. По умолчанию по ядрам.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Сколько картинок записывать в хранилище sorl за раз.'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(
+                settings.BASE_DIR, 'regenerate_thumbnails.checkpoint'
+            ),
+            help='Файл с номером последнего обработанного поста.'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Продолжить с поста, записанного в --checkpoint.'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздавать уже существующие файлы миниатюр.'
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        last_pk = self.read_checkpoint(checkpoint) if options['resume'] else 0
+        images = Post.objects.exclude(image='').filter(
+            pk__gt=last_pk
+        ).order_by('pk').values_list('pk', 'image')
+        job = partial(render_job, force=options['force'])
+        pool = None
+        if options['workers'] > 1:
+            # Дочерние процессы не работают с базой: соединения родителя
+            # не должны достаться им при fork.
+            connections.close_all()
+            pool = multiprocessing.Pool(options['workers'])
+        chunksize = max(options['batch_size'] // (options['workers'] * 4), 1)
+        self.started = time.monotonic()
+        self.done = self.failed = 0
+        try:
+            batch = []
+            for item in images.iterator(chunk_size=options['batch_size']):
+                batch.append(item)
+                if len(batch) == options['batch_size']:
+                    self.run_batch(pool, job, batch, chunksize, checkpoint)
+                    batch = []
+            if batch:
+                self.run_batch(pool, job, batch, chunksize, checkpoint)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        self.stdout.write(self.style.SUCCESS('Миниатюры пересозданы.'))
+
+    def run_batch(self, pool, job, batch, chunksize, checkpoint):
+        if pool is None:
+            results = map(job, batch)
+        else:
+            results = pool.imap_unordered(job, batch, chunksize=chunksize)
+        rendered = []
+        for pk, result, error in results:
+            if result is None:
+                self.failed += 1
+                self.stderr.write(f'Пост {pk}: {error}')
+            else:
+                rendered.append(result)
+        store_thumbnails(rendered)
+        self.write_checkpoint(checkpoint, batch[-1][0])
+        self.done += len(rendered)
+        self.report()
+
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        self.stdout.write(
+            f'Готово: {self.done}, ошибок: {self.failed}, '
+            f'{(self.done + self.failed) / elapsed:.1f} картинок/с'
+        )
+
+    @staticmethod
+    def read_checkpoint(path):
+        try:
+            with open(path) as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def write_checkpoint(path, pk):
+        # Запись через временный файл: прерванный запуск не испортит его.
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as file:
+            file.write(str(pk))
+        os.replace(temporary, path)
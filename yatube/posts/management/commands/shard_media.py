@@ -0,0 +1,72 @@
+from collections import Counter
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.batches import pk_batches
+from posts.counters import acquire_file
+from posts.models import Post, ThumbnailJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов в хранилище с именами по содержимому '
+        'и переписывает пути в базе пачками. Уже перенесённые картинки '
+        'пропускаются, поэтому прерванный перенос можно просто повторить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько постов переносить одной транзакцией.'
+        )
+        parser.add_argument(
+            '--keep-old',
+            action='store_true',
+            help='Не удалять старые файлы после переноса.'
+        )
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        posts = Post.objects.exclude(image='').only('pk', 'image')
+        moved = failed = 0
+        for batch in pk_batches(posts, options['batch_size']):
+            changed = []
+            old_names = set()
+            for post in batch:
+                old_name = post.image.name
+                if storage.is_content_name(old_name):
+                    continue
+                try:
+                    with storage.open(old_name) as file:
+                        post.image.name = storage.save(old_name, File(file))
+                except (OSError, SuspiciousFileOperation) as error:
+                    failed += 1
+                    self.stderr.write(f'Пост {post.pk}: {error}')
+                    continue
+                changed.append(post)
+                old_names.add(old_name)
+            with transaction.atomic():
+                Post.objects.bulk_update(changed, ['image'])
+                refs = Counter(post.image.name for post in changed)
+                for name, count in refs.items():
+                    acquire_file(name, count)
+                # Миниатюры в sorl привязаны к старым именам.
+                ThumbnailJob.objects.bulk_create(
+                    (ThumbnailJob(post=post) for post in changed),
+                    ignore_conflicts=True
+                )
+            if not options['keep_old']:
+                still_used = set(Post.objects.filter(
+                    image__in=old_names
+                ).values_list('image', flat=True))
+                for name in old_names - still_used:
+                    storage.delete(name)
+            moved += len(changed)
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено картинок: {moved}, ошибок: {failed}.'
+        ))
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def enqueue_existing(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    ThumbnailJob = apps.get_model('posts', 'ThumbnailJob')
+    post_ids = Post.objects.exclude(image='').values_list('pk', flat=True)
+    ThumbnailJob.objects.bulk_create(
+        (ThumbnailJob(post_id=post_id) for post_id in post_ids.iterator()),
+        batch_size=1000
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThumbnailJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='выполнить после')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='число попыток')),
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnail_job', to='posts.Post', verbose_name='пост')),
+            ],
+            options={
+                'verbose_name': 'задача генерации миниатюр',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='thumbnailjob',
+            index=models.Index(fields=['run_after'], name='thumbnail_job_run_after_idx'),
+        ),
+        migrations.RunPython(enqueue_existing, migrations.RunPython.noop),
+    ]
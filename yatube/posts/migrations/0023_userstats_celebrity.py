@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_tags_mentions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='celebrity',
+            field=models.BooleanField(default=False, verbose_name='посты не раскладываются по лентам'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:41
+
+from django.db import migrations, models
+import posts.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_userstats_celebrity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearch',
+            fields=[
+                ('rowid', models.IntegerField(primary_key=True, serialize=False, verbose_name='id поста')),
+                ('text', posts.models.SearchField(verbose_name='текст публикации')),
+            ],
+            options={
+                'verbose_name': 'поисковый индекс поста',
+                'db_table': 'posts_post_fts',
+                'managed': False,
+            },
+        ),
+    ]
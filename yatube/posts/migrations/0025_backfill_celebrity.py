@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_celebrity(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        follower_count__gt=settings.FEED_FANOUT_LIMIT
+    ).update(celebrity=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_post_search_model'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_celebrity, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
+from django.db.models import Lookup
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from core.storage import ContentAddressedStorage
+
 
 User = get_user_model()
 
@@ -23,6 +27,27 @@ class Group(models.Model):
         return self.title
 
 
+# Поля автора и группы, которые не нужны шаблонам лент
+AUTHOR_DEFERRED_FIELDS = (
+    'author__password',
+    'author__last_login',
+    'author__is_superuser',
+    'author__email',
+    'author__is_staff',
+    'author__is_active',
+    'author__date_joined',
+)
+FEED_DEFERRED_FIELDS = AUTHOR_DEFERRED_FIELDS + ('group__description',)
+
+
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент: автор и группа одним запросом, без лишних полей."""
+        return self.select_related('author', 'group').defer(
+            *FEED_DEFERRED_FIELDS
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name=_('текст публикации'),
@@ -32,6 +57,10 @@ class Post(models.Model):
         verbose_name=_('дата создания'),
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        verbose_name=_('дата изменения'),
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         verbose_name=_('автор'),
@@ -49,17 +78,93 @@ class Post(models.Model):
     image = models.ImageField(
         verbose_name=_('Картинка'),
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    # Заполняются при загрузке картинки, чтобы ленты не открывали файл
+    image_width = models.PositiveIntegerField(
+        verbose_name=_('ширина картинки'),
+        null=True,
+        editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        verbose_name=_('высота картинки'),
+        null=True,
+        editable=False
+    )
+    image_color = models.CharField(
+        verbose_name=_('основной цвет картинки'),
+        max_length=7,
+        blank=True,
+        editable=False
+    )
+    image_hash = models.CharField(
+        verbose_name=_('SHA-256 картинки'),
+        max_length=64,
+        blank=True,
+        editable=False
+    )
+
+    comment_count = models.PositiveIntegerField(
+        verbose_name=_('число комментариев'),
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'публикация'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
 
+# Путь комментария - номера его предков и его собственный, по
+# COMMENT_PATH_STEP цифр на уровень. Сортировка по пути даёт порядок
+# показа ветки, а все ответы лежат в диапазоне [путь, путь + ':').
+COMMENT_PATH_STEP = 10
+COMMENT_PATH_END = ':'
+
+
+class CommentQuerySet(models.QuerySet):
+    def for_post(self, post_id):
+        """Комментарии поста вместе с авторами одним запросом."""
+        return self.filter(post_id=post_id).select_related('author').defer(
+            *AUTHOR_DEFERRED_FIELDS
+        )
+
+    def subtree(self, comment, max_depth=None):
+        """Ответы на comment в порядке показа одним диапазоном индекса.
+
+        max_depth ограничивает глубину ответов относительно comment.
+        """
+        replies = self.filter(
+            post_id=comment.post_id,
+            path__gt=comment.path,
+            path__lt=comment.path + COMMENT_PATH_END
+        )
+        if max_depth is not None:
+            replies = replies.filter(depth__lte=comment.depth + max_depth)
+        return replies.order_by('path')
+
+
 class Comment(models.Model):
     post = models.ForeignKey(
         Post,
@@ -79,6 +184,44 @@ class Comment(models.Model):
         help_text='Текст нового комментария',
         auto_now_add=True
     )
+    parent = models.ForeignKey(
+        'self',
+        verbose_name=_('ответ на'),
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='replies'
+    )
+    path = models.CharField(
+        verbose_name=_('путь в ветке'),
+        max_length=255,
+        blank=True,
+        editable=False
+    )
+    depth = models.PositiveSmallIntegerField(
+        verbose_name=_('глубина'),
+        default=0,
+        editable=False
+    )
+    reply_count = models.PositiveIntegerField(
+        verbose_name=_('число ответов'),
+        default=0,
+        editable=False
+    )
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['post', 'path'],
+                name='comment_post_path_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -103,3 +246,222 @@ class Follow(models.Model):
                 name='unique user follow'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name=_('подписчик'),
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        verbose_name=_('пост'),
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    pub_date = models.DateTimeField(verbose_name=_('дата создания поста'))
+
+    class Meta:
+        verbose_name = 'запись ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique feed entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='feed_entry_user_date_idx'
+            )
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        verbose_name=_('пользователь'),
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name='stats'
+    )
+    post_count = models.PositiveIntegerField(
+        verbose_name=_('число постов'),
+        default=0
+    )
+    follower_count = models.PositiveIntegerField(
+        verbose_name=_('число подписчиков'),
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name=_('число подписок'),
+        default=0
+    )
+    # Посты автора, хоть раз бывшего выше FEED_FANOUT_LIMIT, не лежат в
+    # лентах части подписчиков, поэтому флаг не снимается.
+    celebrity = models.BooleanField(
+        verbose_name=_('посты не раскладываются по лентам'),
+        default=False
+    )
+
+    class Meta:
+        verbose_name = 'статистика пользователя'
+
+
+class ThumbnailJob(models.Model):
+    post = models.OneToOneField(
+        Post,
+        verbose_name=_('пост'),
+        on_delete=models.CASCADE,
+        related_name='thumbnail_job'
+    )
+    run_after = models.DateTimeField(
+        verbose_name=_('выполнить после'),
+        default=timezone.now
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name=_('число попыток'),
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'задача генерации миниатюр'
+        indexes = [
+            models.Index(
+                fields=['run_after'],
+                name='thumbnail_job_run_after_idx'
+            ),
+        ]
+
+
+class MediaFile(models.Model):
+    name = models.CharField(
+        verbose_name=_('имя файла'),
+        max_length=100,
+        unique=True
+    )
+    ref_count = models.PositiveIntegerField(
+        verbose_name=_('число ссылок'),
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'файл медиа'
+
+
+class Tag(models.Model):
+    name = models.CharField(
+        verbose_name=_('хештег'),
+        max_length=50,
+        unique=True
+    )
+    post_count = models.PositiveIntegerField(
+        verbose_name=_('число постов'),
+        default=0,
+        editable=False
+    )
+
+    class Meta:
+        verbose_name = 'хештег'
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+# Дата поста повторена в ссылках, чтобы страницы хештега и упоминаний
+# выбирались одним диапазоном индекса, как лента подписок.
+class PostTag(models.Model):
+    post = models.ForeignKey(
+        Post,
+        verbose_name=_('пост'),
+        on_delete=models.CASCADE,
+        related_name='post_tags'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        verbose_name=_('хештег'),
+        on_delete=models.CASCADE,
+        related_name='post_tags'
+    )
+    pub_date = models.DateTimeField(verbose_name=_('дата создания поста'))
+
+    class Meta:
+        verbose_name = 'хештег поста'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'tag'],
+                name='unique post tag'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'pub_date', 'post'],
+                name='post_tag_tag_date_idx'
+            )
+        ]
+
+
+class Mention(models.Model):
+    post = models.ForeignKey(
+        Post,
+        verbose_name=_('пост'),
+        on_delete=models.CASCADE,
+        related_name='mentions'
+    )
+    user = models.ForeignKey(
+        User,
+        verbose_name=_('упомянутый пользователь'),
+        on_delete=models.CASCADE,
+        related_name='mentions'
+    )
+    pub_date = models.DateTimeField(verbose_name=_('дата создания поста'))
+
+    class Meta:
+        verbose_name = 'упоминание'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'user'],
+                name='unique mention'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='mention_user_date_idx'
+            )
+        ]
+
+
+class SearchField(models.TextField):
+    """Столбец полнотекстового индекса FTS5."""
+
+
+@SearchField.register_lookup
+class Match(Lookup):
+    """Поиск выражения FTS5: search__match='"кот"*'."""
+
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+# Таблицу FTS5 и её триггеры создаёт миграция 0021, Django только читает.
+class PostSearch(models.Model):
+    rowid = models.IntegerField(verbose_name=_('id поста'), primary_key=True)
+    text = SearchField(verbose_name=_('текст публикации'))
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+        verbose_name = 'поисковый индекс поста'
@@ -0,0 +1,186 @@
+import base64
+import binascii
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+
+class KeysetPaginator(Paginator):
+    """Постраничный вывод по ключу (pub_date, id).
+
+    Страницы выбираются диапазоном по индексу от курсора предыдущей
+    страницы, без COUNT(*) и OFFSET, поэтому глубина страницы не влияет
+    на стоимость запроса. Объект создаётся на один запрос: после
+    get_page() num_pages содержит известную нижнюю границу числа страниц.
+    """
+
+    # Поля ключа в запросе и их атрибуты у объектов страницы
+    keys = ('pub_date', 'pk')
+    cursor_fields = ('pub_date', 'pk')
+    descending = True
+
+    def __init__(self, object_list, per_page, **kwargs):
+        date_key, id_key = self.keys
+        direction = '-' if self.descending else ''
+        super().__init__(
+            object_list.order_by(
+                f'{direction}{date_key}', f'{direction}{id_key}'
+            ),
+            per_page,
+            **kwargs
+        )
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        return max(number, 1)
+
+    @staticmethod
+    def encode_key(value):
+        return value.isoformat()
+
+    @staticmethod
+    def decode_key(raw):
+        value = parse_datetime(raw)
+        if value is None:
+            raise ValueError(raw)
+        return value
+
+    @classmethod
+    def encode_cursor(cls, number, obj):
+        date_field, id_field = cls.cursor_fields
+        date, pk = getattr(obj, date_field), getattr(obj, id_field)
+        raw = f'{number}|{cls.encode_key(date)}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @classmethod
+    def decode_cursor(cls, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode()).decode()
+            number, pub_date, pk = raw.split('|')
+            return int(number), cls.decode_key(pub_date), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+
+    def get_page(self, number=None, after=None, before=None):
+        """Возвращает страницу по курсору after/before или по номеру.
+
+        Номер страницы без курсора поддерживается для старых ссылок
+        вида ?page=N и выбирается через OFFSET, но без подсчёта строк.
+        """
+        cursor = self.decode_cursor(after or before or '')
+        if cursor is None:
+            return self._offset_page(self.validate_number(number))
+        number, pub_date, pk = cursor
+        if after:
+            return self._keyset_page(number + 1, pub_date, pk)
+        return self._reverse_keyset_page(number - 1, pub_date, pk)
+
+    def fetch(self, queryset):
+        """Превращает срез object_list в список постов страницы."""
+        return list(queryset)
+
+    def select(self, stop, start=0, key=None, reverse=False):
+        """Посты object_list[start:stop] после ключа key=(дата, id).
+
+        С reverse=True посты берутся перед ключом в обратном порядке.
+        """
+        queryset = self.object_list
+        if key is not None:
+            date_key, id_key = self.keys
+            pub_date, pk = key
+            after = 'lt' if self.descending != reverse else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{date_key}__{after}': pub_date})
+                | Q(**{date_key: pub_date, f'{id_key}__{after}': pk})
+            )
+        if reverse:
+            queryset = queryset.reverse()
+        return self.fetch(queryset[start:stop])
+
+    def _offset_page(self, number):
+        bottom = (number - 1) * self.per_page
+        rows = self.select(bottom + self.per_page + 1, start=bottom)
+        if not rows and number > 1:
+            return self._offset_page(1)
+        return self._build_page(rows, number, len(rows) > self.per_page)
+
+    def _keyset_page(self, number, pub_date, pk):
+        rows = self.select(self.per_page + 1, key=(pub_date, pk))
+        return self._build_page(rows, number, len(rows) > self.per_page)
+
+    def _reverse_keyset_page(self, number, pub_date, pk):
+        rows = self.select(
+            self.per_page + 1, key=(pub_date, pk), reverse=True
+        )
+        if len(rows) <= self.per_page:
+            # Дошли до начала ленты: отдаём полную первую страницу.
+            return self._offset_page(1)
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return self._build_page(rows, max(number, 2), True)
+
+    def get_page_window(self, page):
+        """Возвращает окно ссылок вокруг текущей страницы.
+
+        Элементы окна - пары (номер, строка запроса), пропуск обозначен
+        номером None. В окне только страницы, открываемые без OFFSET:
+        первая, предыдущая и следующая по курсорам и текущая.
+        """
+        number = page.number
+        window = [(1, '')]
+        if number > 3:
+            window.append((None, None))
+        if number > 2:
+            window.append((number - 1, f'?before={page.previous_cursor}'))
+        if number > 1:
+            window.append((number, None))
+        if page.has_next():
+            window.append((number + 1, f'?after={page.next_cursor}'))
+        return window
+
+    def _build_page(self, rows, number, has_next):
+        rows = rows[:self.per_page]
+        self._num_pages = number + 1 if has_next else number
+        page = self._get_page(rows, number, self)
+        page.next_cursor = (
+            self.encode_cursor(number, rows[-1]) if has_next else None
+        )
+        page.previous_cursor = (
+            self.encode_cursor(number, rows[0]) if rows and number > 1
+            else None
+        )
+        page.window = self.get_page_window(page)
+        return page
+
+
+class CommentPaginator(KeysetPaginator):
+    """Комментарии поста от старых к новым по ключу (created, id)."""
+
+    keys = ('created', 'pk')
+    cursor_fields = ('created', 'pk')
+    descending = False
+
+
+def get_page_obj(request, posts, per_page=POSTS_PER_PAGE,
+                 paginator_class=KeysetPaginator):
+    """Возвращает страницу ленты posts по параметрам запроса."""
+    paginator = paginator_class(posts, per_page)
+    return paginator.get_page(
+        request.GET.get('page'),
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
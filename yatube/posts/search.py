@@ -0,0 +1,228 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, TextField
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import PostSearch
+from .paginators import KeysetPaginator
+
+SEARCH_TABLE = PostSearch._meta.db_table
+# Триггеры, которые синхронизируют индекс с posts_post. SQLite удаляет
+# их вместе с таблицей, а миграции, меняющие Post, пересоздают таблицу,
+# поэтому после каждой миграции они создаются заново, если пропали.
+SEARCH_TRIGGERS = {
+    'posts_post_fts_insert': """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+    'posts_post_fts_delete': """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END
+    """,
+    'posts_post_fts_update': """
+    CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+    AFTER UPDATE OF text ON posts_post
+    WHEN old.text IS NOT new.text BEGIN
+        INSERT INTO posts_post_fts(posts_post_fts, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);
+    END
+    """,
+}
+SEARCH_MAX_TERMS = 8
+# Основы короче этого ищутся как слово целиком, а не префиксом
+MIN_PREFIX_LENGTH = 3
+# Служебные слова есть почти в каждом посте и не сужают поиск
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'все', 'да', 'для', 'до', 'его',
+    'ее', 'же', 'за', 'и', 'из', 'или', 'им', 'их', 'к', 'как', 'ко',
+    'ли', 'мы', 'на', 'над', 'не', 'нет', 'ни', 'но', 'о', 'об', 'он',
+    'она', 'они', 'оно', 'от', 'по', 'под', 'при', 'про', 'с', 'со',
+    'так', 'то', 'ты', 'у', 'уже', 'что', 'это', 'я',
+))
+SNIPPET_TOKENS = 24
+# Границы совпадений в сниппете: управляющие символы не встречаются
+# в тексте постов, поэтому HTML можно экранировать уже после SQLite.
+MARK_START, MARK_END = '\x02', '\x03'
+
+# Окончания русского стеммера Портера (Snowball). Группы с (?<=[ая])
+# снимаются только после «а» или «я».
+_VOWELS = 'аеиоуыэюя'
+_PERFECTIVE_GERUND = re.compile(
+    r'(ив|ивши|ившись|ыв|ывши|ывшись|(?<=[ая])(в|вши|вшись))$'
+)
+_REFLEXIVE = re.compile(r'(ся|сь)$')
+_ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых'
+    r'|ую|юю|ая|яя|ою|ею)$'
+)
+_PARTICIPLE = re.compile(r'(ивш|ывш|ующ|(?<=[ая])(ем|нн|вш|ющ|щ))$')
+_VERB = re.compile(
+    r'(ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло'
+    r'|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю'
+    r'|(?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно))$'
+)
+_NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием'
+    r'|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+_SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+_I = re.compile(r'и$')
+_WORD = re.compile(r'\w+')
+
+
+def _strip(pattern, word):
+    stripped = pattern.sub('', word, count=1)
+    return stripped, stripped != word
+
+
+def stem(word):
+    """Основа русского слова: окончание снимается в области после
+    первой гласной. Слова на латинице возвращаются как есть.
+    """
+    word = word.lower().replace('ё', 'е')
+    for i, char in enumerate(word):
+        if char in _VOWELS:
+            head, rv = word[:i + 1], word[i + 1:]
+            break
+    else:
+        return word
+    rv, found = _strip(_PERFECTIVE_GERUND, rv)
+    if not found:
+        rv, _ = _strip(_REFLEXIVE, rv)
+        rv, found = _strip(_ADJECTIVE, rv)
+        if found:
+            rv, _ = _strip(_PARTICIPLE, rv)
+        else:
+            rv, found = _strip(_VERB, rv)
+            if not found:
+                rv, _ = _strip(_NOUN, rv)
+    rv, _ = _strip(_I, rv)
+    rv, _ = _strip(_SUPERLATIVE, rv)
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    elif rv.endswith('ь'):
+        rv = rv[:-1]
+    return head + rv
+
+
+def restore_search_triggers(using='default'):
+    """Создаёт пропавшие триггеры индекса и перестраивает индекс.
+
+    Записи, сделанные без триггеров, в индекс не попали, поэтому после
+    восстановления он собирается заново. Возвращает имена триггеров,
+    которых не было.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return set()
+    with connection.cursor() as cursor:
+        if SEARCH_TABLE not in connection.introspection.table_names(cursor):
+            return set()
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+        )
+        missing = set(SEARCH_TRIGGERS) - {name for name, in cursor}
+        for name in sorted(missing):
+            cursor.execute(SEARCH_TRIGGERS[name])
+        if missing:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) '
+                "VALUES ('rebuild')"
+            )
+    return missing
+
+
+def match_expression(query):
+    """Запрос FTS5 из пользовательской строки или '' без слов.
+
+    Индекс хранит словоформы как есть, поэтому каждое слово ищется
+    префиксом по своей основе: «котами» находит «кот», «коты», «котов».
+    Служебные слова отбрасываются, а слова с основой короче
+    MIN_PREFIX_LENGTH ищутся целиком: префикс «ёж» нашёл бы и «ежевику».
+    Слова запроса соединяются через AND, синтаксис FTS5 из строки
+    пользователя не пропускается.
+    """
+    terms = []
+    for word in _WORD.findall(query.lower()):
+        if word.replace('ё', 'е') in STOP_WORDS:
+            continue
+        term = stem(word)
+        if len(term) < MIN_PREFIX_LENGTH:
+            terms.append(f'"{word}"')
+        else:
+            terms.append(f'"{term}"*')
+    return ' '.join(terms[:SEARCH_MAX_TERMS])
+
+
+def matching_ids(expression):
+    """Подзапрос id постов, найденных выражением FTS5."""
+    return PostSearch.objects.filter(text__match=expression).values('rowid')
+
+
+def search_posts(queryset, expression):
+    """Посты queryset, найденные expression, с рангом BM25 и сниппетом.
+
+    Меньший search_rank означает более релевантный пост. Ранг и сниппет
+    считаются коррелированными подзапросами только для найденных постов.
+    """
+    match = (
+        f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s '
+        f'AND {SEARCH_TABLE}.rowid = posts_post.id'
+    )
+    return queryset.filter(pk__in=matching_ids(expression)).annotate(
+        search_rank=RawSQL(
+            f'SELECT bm25({SEARCH_TABLE}) {match}',
+            [expression],
+            FloatField()
+        ),
+        search_snippet=RawSQL(
+            f"SELECT snippet({SEARCH_TABLE}, 0, char(2), char(3), '…', %s) "
+            f'{match}',
+            [SNIPPET_TOKENS, expression],
+            TextField()
+        ),
+    )
+
+
+def highlight(snippet):
+    """HTML сниппета: текст экранирован, совпадения выделены <mark>."""
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class SearchPaginator(KeysetPaginator):
+    """Результаты поиска по ключу (ранг BM25, id).
+
+    BM25 учитывает статистику всего индекса: после правки постов
+    соседние страницы могут сдвинуться на несколько результатов.
+    """
+
+    keys = ('search_rank', 'pk')
+    cursor_fields = ('search_rank', 'pk')
+    descending = False
+
+    @staticmethod
+    def encode_key(value):
+        return repr(value)
+
+    @staticmethod
+    def decode_key(raw):
+        return float(raw)
+
+    def fetch(self, queryset):
+        posts = list(queryset)
+        for post in posts:
+            post.snippet = highlight(post.search_snippet)
+        return posts
@@ -0,0 +1,182 @@
+from django.db.models.signals import (post_delete, post_init,
+                                      post_migrate, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import autocomplete
+from .caching import (GLOBAL_FEED, GROUPS_FEED, USERS_FEED, author_feed,
+                      bump_generations, group_feed, mention_feed, post_feed,
+                      tag_feed, user_feed)
+from .counters import (change_comment_count, change_file_refs,
+                       decrement_stats, increment_stats)
+from .feed import (backfill_follow, fan_out_post, mark_celebrities,
+                   prune_follow)
+from .images import fill_image_meta
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .search import restore_search_triggers
+from .tags import (change_tag_counts, extract_hashtags, extract_mentions,
+                   index_post, linked_tags)
+from .threads import attach_comment, change_reply_counts
+from .thumbnails import enqueue_thumbnails
+
+
+USER_NAME_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, update_fields, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    # Вход в систему сохраняет только last_login, имена не меняются.
+    if update_fields is None or USER_NAME_FIELDS & update_fields:
+        autocomplete.user_changed(instance)
+        if not created:
+            # Имя автора выводится в карточках его постов.
+            bump_generations(USERS_FEED, user_feed(instance.pk))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.entry_removed(autocomplete.USER, instance.pk)
+
+
+def bump_post_feeds(post):
+    group_ids = {post.group_id, post.loaded_group_id} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True
+    )
+    # Хештеги и упоминания из текста до и после правки.
+    texts = (post.text, post.loaded_text or '')
+    tags = set().union(*map(extract_hashtags, texts))
+    mentions = set().union(*map(extract_mentions, texts))
+    bump_generations(
+        GLOBAL_FEED,
+        post_feed(post.pk),
+        author_feed(post.author.username),
+        *(group_feed(slug) for slug in slugs),
+        *(tag_feed(name) for name in tags),
+        *(mention_feed(username) for username in mentions)
+    )
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    # Группа до правки: её лента тоже устаревает при смене группы.
+    instance.loaded_group_id = instance.group_id
+    # Картинка и текст до правки; __dict__, чтобы не загружать
+    # отложенные поля.
+    instance.loaded_image = str(instance.__dict__.get('image') or '')
+    instance.loaded_text = instance.__dict__.get('text')
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    image_changed = (instance.image.name or '') != instance.loaded_image
+    if instance._state.adding or image_changed:
+        fill_image_meta(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        increment_stats(instance.author_id, post_count=1)
+        fan_out_post(instance)
+    bump_post_feeds(instance)
+    change_post_index(instance, created)
+    instance.loaded_group_id = instance.group_id
+    image_changed = instance.image.name != instance.loaded_image
+    if created or image_changed:
+        change_file_refs(
+            instance.image.storage,
+            '' if created else instance.loaded_image,
+            instance.image.name or ''
+        )
+        if instance.image:
+            enqueue_thumbnails(instance)
+    instance.loaded_image = instance.image.name or ''
+
+
+def change_post_index(post, created):
+    """Хештеги и упоминания поста и подсказки после записи поста."""
+    old_group_id = None if created else post.loaded_group_id
+    if old_group_id != post.group_id:
+        if old_group_id:
+            autocomplete.change_score(autocomplete.GROUP, old_group_id, -1)
+        if post.group_id:
+            autocomplete.change_score(autocomplete.GROUP, post.group_id, 1)
+    old_text = '' if created else post.loaded_text
+    if old_text is not None and old_text != post.text:
+        autocomplete.change_tags(*index_post(post, old_text))
+    post.loaded_text = post.text
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Хештеги, на которые есть ссылки: каскад удалит их до post_delete.
+    tags = extract_hashtags(instance.text)
+    instance.linked_tags = linked_tags(instance, tags) if tags else set()
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    decrement_stats(instance.author_id, 'post_count')
+    change_file_refs(instance.image.storage, instance.image.name or '', '')
+    bump_post_feeds(instance)
+    if instance.group_id:
+        autocomplete.change_score(autocomplete.GROUP, instance.group_id, -1)
+    # Ссылки на хештеги удалены каскадом, остаются их счётчики.
+    change_tag_counts(instance.linked_tags, -1)
+    autocomplete.change_tags(set(), instance.linked_tags)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    bump_generations(GROUPS_FEED)
+    autocomplete.group_changed(instance)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    bump_generations(GROUPS_FEED)
+    autocomplete.entry_removed(autocomplete.GROUP, instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        attach_comment(instance)
+        change_comment_count(instance.post_id, 1)
+        bump_generations(post_feed(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_reply_counts(instance.path, -1)
+    change_comment_count(instance.post_id, -1)
+    bump_generations(post_feed(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        increment_stats(instance.author_id, follower_count=1)
+        increment_stats(instance.user_id, following_count=1)
+        mark_celebrities(user_id=instance.author_id)
+        backfill_follow(instance)
+        bump_generations(author_feed(instance.author.username))
+        autocomplete.change_score(autocomplete.USER, instance.author_id, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    decrement_stats(instance.author_id, 'follower_count')
+    decrement_stats(instance.user_id, 'following_count')
+    prune_follow(instance)
+    bump_generations(author_feed(instance.author.username))
+    autocomplete.change_score(autocomplete.USER, instance.author_id, -1)
+
+
+@receiver(post_migrate)
+def search_index_migrated(sender, using, **kwargs):
+    # Миграция другого приложения тоже может пересоздать posts_post.
+    restore_search_triggers(using)
@@ -0,0 +1,131 @@
+import re
+
+from django.conf import settings
+from django.db.models import F
+
+from .models import Mention, PostTag, Tag, User
+
+# Хештег - слово после «#», не приклеенного к другому слову
+HASHTAG_RE = re.compile(r'(?<!\w)#(\w{1,50})')
+# Упоминание - имя пользователя после «@»; точка в конце - знак препинания
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.@+-]{1,150})')
+
+
+def extract_hashtags(text):
+    """Множество хештегов текста в нижнем регистре, без «#»."""
+    return {tag.lower() for tag in HASHTAG_RE.findall(text or '')}
+
+
+def extract_mentions(text):
+    """Множество имён пользователей, упомянутых в тексте."""
+    return {name.rstrip('.') for name in MENTION_RE.findall(text or '')}
+
+
+def linked_tags(post, names):
+    """Хештеги names, у которых уже есть ссылка на post."""
+    return set(PostTag.objects.filter(
+        post=post, tag__name__in=names
+    ).values_list('tag__name', flat=True))
+
+
+def mention_links(post, usernames):
+    users = User.objects.filter(username__in=usernames).values_list(
+        'pk', flat=True
+    )
+    return [
+        Mention(post_id=post.pk, user_id=pk, pub_date=post.pub_date)
+        for pk in users
+    ]
+
+
+def change_tag_counts(names, delta):
+    if names:
+        Tag.objects.filter(name__in=names).update(
+            post_count=F('post_count') + delta
+        )
+
+
+def index_post(post, old_text):
+    """Приводит хештеги и упоминания поста в соответствие с текстом.
+
+    Возвращает хештеги, ссылки на которые созданы и удалены. Пост без
+    «#» и «@» в старом и новом тексте не стоит ни одного запроса.
+    """
+    old_tags, new_tags = extract_hashtags(old_text), extract_hashtags(
+        post.text
+    )
+    added, removed = new_tags - old_tags, old_tags - new_tags
+    # Счётчики меняются по ссылкам, реально созданным и удалённым:
+    # у постов, ещё не прошедших backfill_tags, ссылок может не быть.
+    if added:
+        added -= linked_tags(post, added)
+    if added:
+        Tag.objects.bulk_create(
+            (Tag(name=name) for name in added), ignore_conflicts=True
+        )
+        tags = Tag.objects.filter(name__in=added).values_list('pk', flat=True)
+        PostTag.objects.bulk_create(
+            PostTag(post_id=post.pk, tag_id=pk, pub_date=post.pub_date)
+            for pk in tags
+        )
+        change_tag_counts(added, 1)
+    if removed:
+        removed = linked_tags(post, removed)
+    if removed:
+        PostTag.objects.filter(post=post, tag__name__in=removed).delete()
+        change_tag_counts(removed, -1)
+    old_mentions = extract_mentions(old_text)
+    new_mentions = extract_mentions(post.text)
+    if new_mentions - old_mentions:
+        Mention.objects.bulk_create(
+            mention_links(post, new_mentions - old_mentions),
+            ignore_conflicts=True
+        )
+    if old_mentions - new_mentions:
+        Mention.objects.filter(
+            post=post, user__username__in=old_mentions - new_mentions
+        ).delete()
+    return added, removed
+
+
+def backfill_posts(posts):
+    """Добавляет недостающие хештеги и упоминания постов posts.
+
+    posts - пачка постов с полями pk, text и pub_date. Существующие
+    ссылки не дублируются, счётчики хештегов не меняются.
+    """
+    names, usernames = set(), set()
+    extracted = []
+    for post in posts:
+        tags, mentions = extract_hashtags(post.text), extract_mentions(
+            post.text
+        )
+        names |= tags
+        usernames |= mentions
+        extracted.append((post, tags, mentions))
+    Tag.objects.bulk_create(
+        (Tag(name=name) for name in names), ignore_conflicts=True
+    )
+    tag_ids = dict(
+        Tag.objects.filter(name__in=names).values_list('name', 'pk')
+    )
+    user_ids = dict(
+        User.objects.filter(username__in=usernames).values_list(
+            'username', 'pk'
+        )
+    )
+    PostTag.objects.bulk_create(
+        (PostTag(post_id=post.pk, tag_id=tag_ids[name],
+                 pub_date=post.pub_date)
+         for post, tags, _ in extracted for name in tags),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    Mention.objects.bulk_create(
+        (Mention(post_id=post.pk, user_id=user_ids[name],
+                 pub_date=post.pub_date)
+         for post, _, mentions in extracted for name in mentions
+         if name in user_ids),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
@@ -0,0 +1,13 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.caching import render_post_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, show_author=True, show_group=True):
+    """Возвращает готовый HTML карточек постов страницы."""
+    cards = render_post_cards(posts, show_author, show_group)
+    return [mark_safe(card) for card in cards]
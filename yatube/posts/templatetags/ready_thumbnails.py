@@ -0,0 +1,13 @@
+from django import template
+
+from posts.thumbnails import card_picture, post_thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_picture(post):
+    """Варианты картинки поста для <picture> или None, пока их нет."""
+    if not post.image:
+        return None
+    return card_picture(post_thumbnails(post), post.image_width)
@@ -0,0 +1,86 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+
+from ..models import Group, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+User = get_user_model()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostPagesTestCase(TestCase):
+    """Автор, подписчик, группа и пост с картинкой для тестов страниц."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.follower = User.objects.create_user(username='TestFollower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='gruppen',
+            description='Тестовое описание группы'
+        )
+        image = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.test_image = SimpleUploadedFile(
+            name="test.png",
+            content=image,
+            content_type="image/png"
+        )
+        cls.posts_single = Post.objects.create(
+            text='Тестовый текст поста',
+            author=cls.user,
+            group=cls.group,
+            image=cls.test_image
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.user = User.objects.get(username='TestUser')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+
+class PostListTestCase(TestCase):
+    """Тринадцать постов одного автора в группе: две страницы ленты."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='gruppen',
+            description='Тестовое описание группы'
+        )
+        objs = (
+            Post(text='Тестовый текст поста номер %s' % i,
+                 author=cls.user,
+                 group=cls.group
+                 ) for i in range(13)
+        )
+        Post.objects.bulk_create(objs)
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
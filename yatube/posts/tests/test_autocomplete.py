@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from ..models import Follow, Post
+from .base import PostPagesTestCase
+
+User = get_user_model()
+
+
+class TestAutocomplete(PostPagesTestCase):
+    def test_autocomplete_ranks_by_popularity(self):
+        """Подсказки по префиксу, популярные авторы выше."""
+        User.objects.create_user(username='tester')
+        Follow.objects.create(user=self.follower, author=self.user)
+        url = reverse('posts:autocomplete')
+        response = self.guest_client.get(url, {'q': 'te'})
+        results = response.json()['results']
+        self.assertEqual(
+            [item['value'] for item in results],
+            ['TestUser', 'tester', 'TestFollower']
+        )
+        self.assertEqual(
+            results[0]['url'],
+            reverse('posts:profile', kwargs={'username': 'TestUser'})
+        )
+        response = self.guest_client.get(url, {'q': '@тест'})
+        self.assertEqual(response.json()['results'], [])
+        response = self.guest_client.get(url, {'q': 'тестовая'})
+        self.assertEqual(
+            [item['type'] for item in response.json()['results']], ['group']
+        )
+
+    def test_autocomplete_updated_on_write(self):
+        """Записи меняют подсказки без пересборки индекса из базы."""
+        url = reverse('posts:autocomplete')
+        self.guest_client.get(url, {'q': 'котики'})
+        post = Post.objects.create(text='Про #котики', author=self.user)
+        Follow.objects.create(user=self.follower, author=self.user)
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, {'q': '#кот'})
+        self.assertEqual(response.json()['results'], [{
+            'type': 'tag',
+            'value': 'котики',
+            'label': '#котики',
+            'url': reverse('posts:tag_posts', kwargs={'name': 'котики'}),
+        }])
+        post.text = 'Про собак'
+        post.save()
+        response = self.guest_client.get(url, {'q': '#кот'})
+        self.assertEqual(response.json()['results'], [])
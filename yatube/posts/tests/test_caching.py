@@ -0,0 +1,221 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..caching import (card_generations, get_or_compute, post_card_key,
+                       render_post_cards)
+from ..models import Follow, Post
+from .base import PostPagesTestCase
+
+
+class TestGetOrCompute(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'value {self.calls}'
+
+    def test_miss_is_computed_once(self):
+        """Промах вычисляется один раз, дальше значение берётся из кеша."""
+        for _ in range(3):
+            value = get_or_compute('key', self.compute, 60)
+        self.assertEqual(value, 'value 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_locked_miss_serves_stale_value(self):
+        """Пока другой процесс пересчитывает, отдаётся устаревшая копия."""
+        cache.set('stale', ('old value', time.time() + 60, 0.1))
+        cache.add('lock:key', 1)
+        value = get_or_compute('key', self.compute, 60, stale_key='stale')
+        self.assertEqual(value, 'old value')
+        self.assertEqual(self.calls, 0)
+
+    def test_locked_miss_waits_for_result(self):
+        """Без устаревшей копии запрос ждёт результат другого процесса."""
+        cache.add('lock:key', 1)
+
+        def sleep(seconds):
+            cache.set('key', ('computed elsewhere', time.time() + 60, 0.1))
+
+        with mock.patch('posts.caching.time.sleep', sleep):
+            value = get_or_compute('key', self.compute, 60)
+        self.assertEqual(value, 'computed elsewhere')
+        self.assertEqual(self.calls, 0)
+
+    def test_expiring_value_is_recomputed_early(self):
+        """Истекающее значение пересчитывается заранее."""
+        # Срок пересчёта выбирается случайно; 0.5 даёт запас в 69 с.
+        with mock.patch('posts.caching.random.random', return_value=0.5):
+            cache.set('key', ('old value', time.time() + 1, 100))
+            value = get_or_compute('key', self.compute, 60)
+            self.assertEqual(value, 'value 1')
+            cache.add('lock:key', 1)
+            cache.set('key', ('old value', time.time() + 1, 100))
+            value = get_or_compute('key', self.compute, 60)
+            self.assertEqual(value, 'old value')
+
+    def test_fresh_value_is_not_recomputed(self):
+        """Значение далеко от срока не пересчитывается."""
+        cache.set('key', ('old value', time.time() + 60, 100))
+        with mock.patch('posts.caching.random.random', return_value=0.1):
+            value = get_or_compute('key', self.compute, 60)
+        self.assertEqual(value, 'old value')
+        self.assertEqual(self.calls, 0)
+
+
+class TestPageCache(PostPagesTestCase):
+    def test_index_cache_invalidated_on_write(self):
+        """Новый пост сразу виден на закешированных страницах."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'gruppen'}),
+            reverse('posts:profile', kwargs={'username': 'TestUser'}),
+        )
+        for url in pages:
+            self.guest_client.get(url)
+        Post.objects.create(
+            text='Новый пост в кеше', author=self.user, group=self.group
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Новый пост в кеше')
+
+    def test_author_reads_own_writes(self):
+        """После создания поста автор читает ленты мимо кеша."""
+        self.authorized_client.get(reverse('posts:index'))
+        self.authorized_client.post(
+            reverse('posts:post_create'), data={'text': 'Мой новый пост'}
+        )
+        self.authorized_client.get(reverse('posts:index'))
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+
+    def test_post_card_fragment_cache(self):
+        """Правка поста обновляет только его карточку в кеше."""
+        other = Post.objects.create(text='Другой пост', author=self.user)
+        posts = [self.posts_single, other]
+        generations = card_generations(posts)
+        keys = [post_card_key(post, '11', generations) for post in posts]
+        render_post_cards(posts)
+        self.assertEqual(len(cache.get_many(keys)), 2)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': other.pk}),
+            data={'text': 'Исправленный пост'}
+        )
+        other.refresh_from_db()
+        self.assertIn(keys[0], cache.get_many(keys))
+        self.assertNotEqual(post_card_key(other, '11', generations), keys[1])
+        cards = render_post_cards([self.posts_single, other])
+        self.assertIn('Исправленный пост', cards[1])
+
+    def test_post_card_follows_author_name(self):
+        """Смена имени автора обновляет его карточки и страницы лент."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        self.user.first_name = 'Переименованный'
+        self.user.save()
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Переименованный')
+
+    def test_page_shell_shared_between_users(self):
+        """Кеш страницы общий, а шапка и подписка у каждого свои."""
+        url = reverse('posts:profile', kwargs={'username': 'TestUser'})
+        self.guest_client.get(url)
+        Follow.objects.create(user=self.follower, author=self.user)
+        self.guest_client.get(url)
+        follower_client = Client()
+        follower_client.force_login(self.follower)
+        response = follower_client.get(url)
+        self.assertNotIn('page_obj', response.context)
+        self.assertContains(response, 'Пользователь: TestFollower')
+        self.assertContains(response, 'Отписаться')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Подписаться')
+        self.assertNotContains(response, 'Пользователь:')
+
+    def test_conditional_get_not_modified(self):
+        """Неизменённая страница отдаётся ответом 304."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'gruppen'}),
+            reverse('posts:profile', kwargs={'username': 'TestUser'}),
+            reverse('posts:post_detail', args=[self.posts_single.pk]),
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn('Last-Modified', response)
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_conditional_get_modified_on_write(self):
+        """Правка поста и новый комментарий меняют валидаторы."""
+        post = Post.objects.create(text='Новый пост', author=self.user)
+        url = reverse('posts:post_detail', args=[post.pk])
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        post.comments.create(author=self.user, text='Коммент')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_modified_on_edit(self):
+        """Правка поста меняет Last-Modified страниц с ним."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'gruppen'}),
+            reverse('posts:profile', kwargs={'username': 'TestUser'}),
+        )
+        modified = {
+            url: self.guest_client.get(url)['Last-Modified'] for url in pages
+        }
+        # HTTP-дата с точностью до секунды: правка позже на минуту.
+        later = time.time() + 60
+        with mock.patch('posts.caching.time.time', return_value=later):
+            self.authorized_client.post(
+                reverse('posts:post_edit', args=[self.posts_single.pk]),
+                {'text': self.posts_single.text, 'group': self.group.pk}
+            )
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=modified[url]
+                )
+                self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_depends_on_user(self):
+        """ETag гостя не подходит авторизованному пользователю."""
+        url = reverse('posts:index')
+        etag = self.guest_client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_page_keeps_its_validators(self):
+        """Устаревшая копия страницы не закрепляется ответом 304."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        self.authorized_client.post(
+            reverse('posts:post_edit', args=[self.posts_single.pk]),
+            {'text': 'Исправленный текст', 'group': self.group.pk}
+        )
+        # Страницу пересобирает другой процесс: отдаётся старая копия.
+        with mock.patch('posts.caching.cache.add', return_value=False):
+            response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Исправленный текст')
+        response = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Исправленный текст')
@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Follow, Group, MediaFile, Post, Tag
+from ..thumbnails import ready_thumbnail, variant_name
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CARD_IMAGE = variant_name('card', 960, 'JPEG')
+
+User = get_user_model()
+
+
+class TestCommands(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.follower = User.objects.create_user(username='TestFollower')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='gruppen',
+            description='Тестовое описание группы'
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        for i in range(3):
+            Post.objects.create(
+                text=f'Тестовый текст поста {i}',
+                author=cls.user,
+                group=cls.group
+            )
+        Post.objects.create(
+            text='Пост про #котики для @TestFollower', author=cls.user
+        )
+
+    def test_check_query_plans(self):
+        """Запросы страниц постов используют индексы."""
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('post_author_pub_date_idx', out.getvalue())
+        self.assertIn('feed_entry_user_date_idx', out.getvalue())
+        self.assertIn('post_tag_tag_date_idx', out.getvalue())
+        self.assertIn('mention_user_date_idx', out.getvalue())
+        self.assertIn('VIRTUAL TABLE INDEX 0:M', out.getvalue())
+        self.assertIn(
+            'follow_index celebrity after: SEARCH posts_post USING INDEX '
+            'post_author_pub_date_idx (author_id=? AND pub_date<?)',
+            out.getvalue()
+        )
+
+    def test_backfill_tags(self):
+        """Хештеги и упоминания старых постов попадают в индекс."""
+        Post.objects.bulk_create(
+            Post(text=f'Старый #пост {i} для @TestUser', author=self.user)
+            for i in range(3)
+        )
+        call_command('backfill_tags', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'post_count')),
+            {'котики': 1, 'пост': 3}
+        )
+        self.assertEqual(self.user.mentions.count(), 3)
+        self.assertEqual(self.follower.mentions.count(), 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TestImageCommands(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        user = User.objects.create_user(username='TestUser')
+        cls.posts = []
+        for i in range(3):
+            # Картинки различаются цветом, иначе хранилище их объединит.
+            image = (
+                b'\x47\x49\x46\x38\x39\x61\x02\x00'
+                b'\x01\x00\x80\x00\x00\x00\x00\x00'
+                + bytes((0xFF, 0xFF, 0xFF - i)) + b'\x21\xF9\x04\x00\x00'
+                b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+                b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+                b'\x0A\x00\x3B'
+            )
+            cls.posts.append(Post.objects.create(
+                text=f'Пост с картинкой {i}',
+                author=user,
+                image=SimpleUploadedFile(
+                    name=f'small{i}.gif', content=image,
+                    content_type='image/gif'
+                )
+            ))
+        cls.checkpoint = os.path.join(TEMP_MEDIA_ROOT, 'checkpoint')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_regenerate_thumbnails(self):
+        """Миниатюры создаются пулом процессов и попадают в хранилище."""
+        out = StringIO()
+        call_command(
+            'regenerate_thumbnails', workers=2, batch_size=2,
+            checkpoint=self.checkpoint, stdout=out
+        )
+        self.assertIn('Готово: 3, ошибок: 0', out.getvalue())
+        self.assertFalse(os.path.exists(self.checkpoint))
+        for post in self.posts:
+            with self.subTest(post=post.pk):
+                self.assertIsNotNone(ready_thumbnail(post.image, CARD_IMAGE))
+
+    def test_regenerate_thumbnails_resume(self):
+        """С --resume обрабатываются только посты после контрольной точки."""
+        with open(self.checkpoint, 'w') as file:
+            file.write(str(self.posts[1].pk))
+        out = StringIO()
+        call_command(
+            'regenerate_thumbnails', workers=1, resume=True,
+            checkpoint=self.checkpoint, stdout=out
+        )
+        self.assertIn('Готово: 1, ошибок: 0', out.getvalue())
+        self.assertIsNone(ready_thumbnail(self.posts[0].image, CARD_IMAGE))
+        self.assertIsNotNone(ready_thumbnail(self.posts[2].image, CARD_IMAGE))
+
+    def test_fill_image_meta(self):
+        """Команда заполняет данные картинок старых постов."""
+        Post.objects.update(
+            image_width=None, image_height=None, image_color='', image_hash=''
+        )
+        out = StringIO()
+        call_command('fill_image_meta', batch_size=2, stdout=out)
+        self.assertIn('Заполнены данные картинок: 3', out.getvalue())
+        for post in Post.objects.all():
+            with self.subTest(post=post.pk):
+                self.assertEqual((post.image_width, post.image_height), (2, 1))
+                self.assertEqual(len(post.image_hash), 64)
+
+    def test_shard_media(self):
+        """Старые картинки переносятся в хранилище по содержимому."""
+        shared_name = self.posts[0].image.name
+        storage = self.posts[0].image.storage
+        legacy_dir = os.path.join(TEMP_MEDIA_ROOT, 'posts')
+        with storage.open(shared_name) as source:
+            content = source.read()
+        with open(os.path.join(legacy_dir, 'legacy.gif'), 'wb') as file:
+            file.write(content)
+        legacy = Post.objects.create(
+            text='Старый пост', author=self.posts[0].author,
+            image='posts/legacy.gif'
+        )
+        out = StringIO()
+        call_command('shard_media', batch_size=2, stdout=out)
+        self.assertIn('Перенесено картинок: 1, ошибок: 0', out.getvalue())
+        legacy.refresh_from_db()
+        self.assertEqual(legacy.image.name, shared_name)
+        self.assertEqual(MediaFile.objects.get(name=shared_name).ref_count, 2)
+        self.assertFalse(storage.exists('posts/legacy.gif'))
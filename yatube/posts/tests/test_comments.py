@@ -0,0 +1,99 @@
+from django.test import override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..paginators import COMMENTS_PER_PAGE
+from .base import PostPagesTestCase
+
+
+class TestComments(PostPagesTestCase):
+    def test_comments_paginated(self):
+        """Первая страница комментариев в посте, следующие подгружаются."""
+        post = Post.objects.create(text='Обсуждаемый пост', author=self.user)
+        for i in range(COMMENTS_PER_PAGE + 5):
+            post.comments.create(author=self.follower, text=f'Коммент {i}')
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Коммент 0')
+        self.assertContains(response, 'Показать ещё комментарии')
+        url = reverse('posts:comment_list', args=[post.pk])
+        # Только корневые комментарии: ветки без ответов не читаются.
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                url, {'after': comments.next_cursor}
+            )
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertContains(response, 'Коммент 24')
+        self.assertNotContains(response, 'Показать ещё комментарии')
+
+    @override_settings(COMMENT_MAX_DEPTH=2)
+    def test_comment_threads(self):
+        """Ответы показываются под корнем в порядке веток."""
+        post = Post.objects.create(text='Пост с ветками', author=self.user)
+        first = post.comments.create(author=self.user, text='Корень 1')
+        second = post.comments.create(author=self.user, text='Корень 2')
+        url = reverse('posts:add_comment', args=[post.pk])
+        self.authorized_client.post(
+            url, {'text': 'Ответ 1', 'parent': first.pk}
+        )
+        reply = Comment.objects.get(text='Ответ 1')
+        self.authorized_client.post(
+            url, {'text': 'Ответ 1.1', 'parent': reply.pk}
+        )
+        deep = Comment.objects.get(text='Ответ 1.1')
+        deeper = post.comments.create(
+            author=self.user, text='Слишком глубоко', parent=deep
+        )
+        self.assertEqual((reply.depth, deep.depth, deeper.depth), (1, 2, 2))
+        self.assertEqual(deeper.parent_id, reply.pk)
+        first.refresh_from_db()
+        self.assertEqual(first.reply_count, 3)
+        self.assertEqual(
+            list(Comment.objects.subtree(first, max_depth=1)), [reply]
+        )
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        roots = response.context['comments']
+        self.assertEqual(list(roots), [first, second])
+        self.assertEqual(roots[0].thread, [reply, deep, deeper])
+        self.assertEqual(roots[1].thread, [])
+        reply.delete()
+        first.refresh_from_db()
+        self.assertEqual(first.reply_count, 0)
+
+    @override_settings(COMMENT_THREAD_REPLIES=2)
+    def test_long_thread_loads_by_parts(self):
+        """Длинная ветка обрезается, остальные ответы подгружаются."""
+        post = Post.objects.create(text='Пост с ветками', author=self.user)
+        long_root = post.comments.create(author=self.user, text='Корень 1')
+        short_root = post.comments.create(author=self.user, text='Корень 2')
+        replies = [
+            post.comments.create(
+                author=self.user, text=f'Ответ {i}', parent=long_root
+            )
+            for i in range(5)
+        ]
+        short_reply = post.comments.create(
+            author=self.user, text='Ответ', parent=short_root
+        )
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        roots = response.context['comments']
+        self.assertEqual(roots[0].thread, replies[:2])
+        self.assertEqual(roots[1].thread, [short_reply])
+        self.assertIsNone(roots[1].replies_cursor)
+        url = reverse('posts:comment_replies', args=[post.pk, long_root.pk])
+        self.assertContains(response, url)
+        cursor = roots[0].replies_cursor
+        shown = []
+        while cursor:
+            response = self.guest_client.get(url, {'after': cursor})
+            shown += response.context['replies']
+            cursor = response.context['replies_cursor']
+        self.assertEqual(shown, replies[2:])
+        self.assertNotContains(response, 'Показать ещё ответы')
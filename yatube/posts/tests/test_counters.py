@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+
+from ..caching import render_post_cards
+from ..models import Post, UserStats
+from .base import PostPagesTestCase
+
+User = get_user_model()
+
+
+class TestCounters(PostPagesTestCase):
+    def test_profile_without_stats(self):
+        """Профиль пользователя без строки статистики открывается."""
+        user = User.objects.create_user(username='NoStats')
+        UserStats.objects.filter(user=user).delete()
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': 'NoStats'})
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['post_count'], 0)
+
+    def test_comment_count_displayed(self):
+        """Пост и его карточка показывают счётчик комментариев."""
+        post = Post.objects.create(text='Обсуждаемый пост', author=self.user)
+        render_post_cards([post])
+        post.comments.create(author=self.user, text='Коммент')
+        post.refresh_from_db()
+        self.assertIn('Комментариев: 1', render_post_cards([post])[0])
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertContains(response, 'Комментариев: 1')
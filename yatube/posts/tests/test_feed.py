@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+
+from ..models import FeedEntry, Follow, Post
+from .base import PostPagesTestCase
+
+User = get_user_model()
+
+
+class TestFollowFeed(PostPagesTestCase):
+    def test_feed_entries_follow_fan_out(self):
+        """Посты автора попадают в ленту подписчика и удаляются при отписке."""
+        Follow.objects.create(user=self.follower, author=self.user)
+        new_post = Post.objects.create(text='Новый пост', author=self.user)
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                user=self.follower).values_list('post_id', flat=True)),
+            {self.posts_single.pk, new_post.pk}
+        )
+        self.authorized_client.force_login(self.follower)
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.user}
+        ))
+        self.assertFalse(FeedEntry.objects.filter(user=self.follower).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_follow_page_merges_celebrity_posts(self):
+        """Посты авторов выше порога подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.follower, author=self.user)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.authorized_client.force_login(self.follower)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(
+            self.posts_single, response.context['page_obj'].object_list
+        )
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_celebrity_stays_after_unfollow(self):
+        """Посты автора, бывшего выше порога, не пропадают из ленты."""
+        other = User.objects.create_user(username='OtherFollower')
+        Follow.objects.create(user=self.follower, author=self.user)
+        Follow.objects.create(user=other, author=self.user)
+        new_post = Post.objects.create(text='Пост звезды', author=self.user)
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        Follow.objects.filter(user=other).delete()
+        self.authorized_client.force_login(self.follower)
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context['page_obj'].object_list)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_celebrity_feed_pages_without_repeats(self):
+        """Лента со звездой листается курсором без повторов и пропусков."""
+        other = User.objects.create_user(username='OtherFollower')
+        Follow.objects.create(user=self.follower, author=self.user)
+        for i in range(6):
+            Post.objects.create(text=f'Ранний пост {i}', author=self.user)
+        Follow.objects.create(user=other, author=self.user)
+        for i in range(6):
+            Post.objects.create(text=f'Пост звезды {i}', author=self.user)
+        self.authorized_client.force_login(self.follower)
+        url = reverse('posts:follow_index')
+        first = self.authorized_client.get(url).context['page_obj']
+        second = self.authorized_client.get(
+            url, {'after': first.next_cursor}
+        ).context['page_obj']
+        found = [post.pk for post in [*first, *second]]
+        self.assertEqual(len(first), 10)
+        self.assertFalse(second.has_next())
+        self.assertEqual(
+            found,
+            list(Post.objects.filter(author=self.user).order_by(
+                '-pub_date', '-pk'
+            ).values_list('pk', flat=True))
+        )
+        previous = self.authorized_client.get(
+            url, {'before': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous), list(first))
@@ -1,12 +1,21 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from PIL import Image
+from django.conf import settings
 from ..forms import PostForm, CommentForm
 from ..models import Post, Group, Comment
-from django.test import Client, TestCase
+from ..uploads import NOT_AN_IMAGE, ImageUploadHandler, size_error
+from django.template.defaultfilters import filesizeformat
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
 
 
 User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class TestForm(TestCase):
@@ -97,3 +106,96 @@ class TestForm(TestCase):
         self.assertEqual(comment.text, form_data['text'])
         self.assertEqual(comment.author, self.user)
         self.assertEqual(comment.post, self.posts_single)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TestImageUpload(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    @staticmethod
+    def get_image_file(name, size=(50, 50)):
+        file_obj = BytesIO()
+        Image.new('RGB', size=size, color=(255, 0, 0)).save(file_obj, 'jpeg')
+        file_obj.name = name
+        file_obj.seek(0)
+        return file_obj
+
+    def create_post(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': image}
+        )
+
+    def test_non_image_rejected(self):
+        """Файл, не похожий на картинку, отклоняется по первым байтам."""
+        file_obj = BytesIO(b'#!/bin/sh\necho not an image\n')
+        file_obj.name = 'script.jpg'
+        response = self.create_post(file_obj)
+        self.assertFormError(response, 'form', 'image', NOT_AN_IMAGE)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_oversized_image_rejected(self):
+        """Картинка больше IMAGE_UPLOAD_MAX_SIZE отклоняется."""
+        response = self.create_post(self.get_image_file('big.jpg'))
+        self.assertFormError(
+            response, 'form', 'image',
+            f'Картинка должна быть не больше {filesizeformat(100)}.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_rejected_upload_stops_reading(self):
+        """После отказа остаток тела запроса не читается."""
+        file_obj = self.get_image_file('big.jpg')
+        file_obj = BytesIO(file_obj.read() + b'\0' * 1024 * 1024)
+        file_obj.name = 'big.jpg'
+        request = RequestFactory().post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с картинкой', 'image': file_obj}
+        )
+        request.upload_handlers = [ImageUploadHandler(request)]
+        self.assertNotIn('image', request.FILES)
+        self.assertEqual(request.POST['text'], 'Пост с картинкой')
+        self.assertEqual(request.rejected_upload[1].upload_error, size_error())
+        self.assertGreater(request._stream.remaining, 0)
+
+    def test_exif_removed(self):
+        """EXIF снимается с картинки, его ориентация применяется."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        # Ориентация 6: снимок нужно повернуть на 90 градусов.
+        exif[0x0112] = 6
+        file_obj = BytesIO()
+        Image.new('RGB', size=(40, 20)).save(
+            file_obj, 'jpeg', exif=exif.tobytes()
+        )
+        file_obj.name = 'photo.jpg'
+        file_obj.seek(0)
+        self.create_post(file_obj)
+        post = Post.objects.get()
+        with Image.open(post.image.path) as image:
+            self.assertNotIn('exif', image.info)
+            self.assertEqual(image.size, (20, 40))
+        self.assertEqual((post.image_width, post.image_height), (20, 40))
+
+    @override_settings(IMAGE_UPLOAD_MAX_DIMENSION=20)
+    def test_huge_image_downscaled(self):
+        """Слишком большая картинка уменьшается при загрузке."""
+        self.create_post(self.get_image_file('huge.jpg', size=(80, 40)))
+        post = Post.objects.get()
+        self.assertEqual((post.image_width, post.image_height), (20, 10))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 10))
@@ -0,0 +1,72 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+
+from ..caching import render_post_cards
+from ..models import MediaFile, Post, ThumbnailJob
+from .base import PostPagesTestCase
+
+
+class TestPostImages(PostPagesTestCase):
+    def test_image_stored_by_content(self):
+        """Одинаковые картинки хранятся одним файлом с именем по хешу."""
+        name = self.posts_single.image.name
+        self.assertRegex(name, r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}')
+        self.assertTrue(name.endswith(self.posts_single.image_hash + '.png'))
+        self.test_image.seek(0)
+        copy = Post.objects.create(
+            text='Копия картинки', author=self.user, image=self.test_image
+        )
+        self.assertEqual(copy.image.name, name)
+        self.assertEqual(MediaFile.objects.get(name=name).ref_count, 2)
+        copy.delete()
+        self.assertEqual(MediaFile.objects.get(name=name).ref_count, 1)
+        self.assertTrue(copy.image.storage.exists(name))
+
+    def test_image_meta_saved_on_upload(self):
+        """Размеры, цвет и хеш картинки сохраняются при загрузке."""
+        post = Post.objects.get(pk=self.posts_single.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertRegex(post.image_color, r'^#[0-9a-f]{6}$')
+        self.assertEqual(len(post.image_hash), 64)
+
+    def test_post_card_thumbnails_prefetched(self):
+        """Миниатюры всех карточек страницы ищутся одним запросом."""
+        posts = [self.posts_single] + [
+            Post.objects.create(
+                text=f'Пост с картинкой {i}',
+                author=self.user,
+                image=self.posts_single.image.name
+            )
+            for i in range(3)
+        ]
+        call_command('process_thumbnails', once=True, stdout=StringIO())
+        cache.clear()
+        posts = list(
+            Post.objects.feed().filter(pk__in=[post.pk for post in posts])
+        )
+        with self.assertNumQueries(1):
+            cards = render_post_cards(posts)
+        for card in cards:
+            self.assertIn('card-img my-2" src', card)
+
+    def test_thumbnail_generated_in_background(self):
+        """Пока миниатюра не готова, карточка показывает заглушку."""
+        url = reverse('posts:post_detail', args=[self.posts_single.pk])
+        self.assertTrue(
+            ThumbnailJob.objects.filter(post=self.posts_single).exists()
+        )
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, 'card-img my-2" src')
+        call_command('process_thumbnails', once=True, stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'card-img my-2" src')
+        self.assertContains(response, '480w')
+        # Исходная картинка 2x1: растянутые варианты не предлагаются.
+        self.assertNotContains(response, '720w')
+        self.assertContains(response, 'Исходная картинка, 2&times;1')
+        self.assertContains(response, 'loading="lazy"')
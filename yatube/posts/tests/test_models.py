@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -30,3 +33,53 @@ class PostModelTest(TestCase):
         group = PostModelTest.group
         group_str = group.__str__()
         self.assertEqual(group_str, 'Тестовая группа')
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).post_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).follower_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1
+        )
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).follower_count, 0
+        )
+        post.delete()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).post_count, 0
+        )
+
+    def test_recount_stats(self):
+        """recount_stats восстанавливает счётчики по таблицам."""
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.all().delete()
+        call_command('recount_stats', stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).post_count, 1
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).post_count, 0
+        )
@@ -0,0 +1,115 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.signals import post_migrate
+from django.urls import reverse
+
+from ..models import Post
+from ..search import restore_search_triggers
+from .base import PostListTestCase, PostPagesTestCase
+
+User = get_user_model()
+
+
+class TestSearch(PostPagesTestCase):
+    def test_search_finds_word_forms(self):
+        """Поиск находит другие формы слова и выделяет их в сниппете."""
+        post = Post.objects.create(
+            text='Про <b>котов</b> и собак', author=self.user
+        )
+        Post.objects.create(text='Про кошек', author=self.user)
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'котами'}
+        )
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(list(response.context['page_obj']), [post])
+        self.assertContains(
+            response, '&lt;b&gt;<mark>котов</mark>&lt;/b&gt;'
+        )
+        post.text = 'Про собак'
+        post.save()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'кот'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [])
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'собаки'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [post])
+        post.delete()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'собаки'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_search_triggers_restored_after_migrate(self):
+        """Триггеры индекса, удалённые миграцией, создаются заново."""
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        post = Post.objects.create(text='Пропущенный пост', author=self.user)
+        config = apps.get_app_config('posts')
+        post_migrate.send(
+            sender=config, app_config=config, verbosity=0,
+            interactive=False, using='default', apps=apps, plan=[]
+        )
+        self.assertEqual(restore_search_triggers(), set())
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'пропущенный'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идёт по индексу FTS5 и находит все посты."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.authorized_client.force_login(admin)
+        response = self.authorized_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'тестового'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.posts_single]
+        )
+        other = Post.objects.create(
+            text='Ещё один пост тестового автора', author=self.user
+        )
+        response = self.authorized_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'тестового'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            {self.posts_single, other}
+        )
+
+
+class TestSearchPages(PostListTestCase):
+    def test_search_short_and_stop_words(self):
+        """Короткие слова ищутся целиком, служебные не ищутся."""
+        hedgehog = Post.objects.create(text='Ёж в лесу', author=self.user)
+        berry = Post.objects.create(text='Ежевика в лесу', author=self.user)
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'ёж'})
+        self.assertEqual(list(response.context['page_obj']), [hedgehog])
+        response = self.client.get(url, {'q': 'в лесу'})
+        self.assertEqual(
+            set(response.context['page_obj']), {hedgehog, berry}
+        )
+        response = self.client.get(url, {'q': 'в'})
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_search_pages_by_cursor(self):
+        """Результаты поиска листаются курсором без повторов."""
+        url = reverse('posts:search')
+        response = self.client.get(url, {'q': 'тестовые посты'})
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        response = self.client.get(
+            url, {'q': 'тестовые посты', 'after': first_page.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        found = {post.pk for post in first_page} | {
+            post.pk for post in second_page
+        }
+        self.assertEqual(found, set(Post.objects.values_list('pk', flat=True)))
@@ -0,0 +1,44 @@
+from django.urls import reverse
+
+from ..models import Post, Tag
+from .base import PostPagesTestCase
+
+
+class TestTags(PostPagesTestCase):
+    def test_tag_and_mention_pages(self):
+        """Хештеги и упоминания индексируются при записи поста."""
+        url = reverse('posts:tag_posts', kwargs={'name': 'котики'})
+        mentions_url = reverse(
+            'posts:mentions', kwargs={'username': 'TestFollower'}
+        )
+        self.assertEqual(self.guest_client.get(url).status_code, 404)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            {'text': 'Про #Котики, спасибо @TestFollower.'}
+        )
+        post = Post.objects.get(text__startswith='Про #Котики')
+        response = self.guest_client.get(url)
+        self.assertTemplateUsed(response, 'posts/post_list.html')
+        self.assertEqual(list(response.context['page_obj']), [post])
+        response = self.guest_client.get(mentions_url)
+        self.assertEqual(list(response.context['page_obj']), [post])
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            {'text': 'Про собак'}
+        )
+        response = self.guest_client.get(url)
+        self.assertEqual(list(response.context['page_obj']), [])
+        self.assertEqual(Tag.objects.get(name='котики').post_count, 0)
+        response = self.guest_client.get(mentions_url)
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_tag_counts_follow_links(self):
+        """Счётчик хештега меняют только реальные ссылки на него."""
+        post = Post.objects.create(text='Про #cats', author=self.user)
+        Post.objects.bulk_create([Post(text='Старый #cats', author=self.user)])
+        legacy = Post.objects.get(text='Старый #cats')
+        legacy.text = 'Старый пост'
+        legacy.save()
+        self.assertEqual(Tag.objects.get(name='cats').post_count, 1)
+        post.delete()
+        self.assertEqual(Tag.objects.get(name='cats').post_count, 0)
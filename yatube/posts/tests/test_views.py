@@ -1,65 +1,17 @@
-import shutil
-import tempfile
-from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.test import Client
 from django.urls import reverse
 from django import forms
-from ..models import Post, Group, Follow
+from ..models import Post, Follow
+from ..paginators import KeysetPaginator
+from .base import PostListTestCase, PostPagesTestCase
 from django.core.cache import cache
 
 
 User = get_user_model()
 
 
-@override_settings(MEDIA_ROOT=tempfile.mkdtemp(dir=settings.BASE_DIR))
-class TestPostPages(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
-        cls.user = User.objects.create_user(username='TestUser')
-        cls.follower = User.objects.create_user(username='TestFollower')
-        cls.group = Group.objects.create(
-            title='Тестовая группа',
-            slug='gruppen',
-            description='Тестовое описание группы'
-        )
-        image = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-        )
-        cls.test_image = SimpleUploadedFile(
-            name="test.png",
-            content=image,
-            content_type="image/png"
-        )
-        cls.posts_single = Post.objects.create(
-            text='Тестовый текст поста',
-            author=cls.user,
-            group=cls.group,
-            image=cls.test_image
-        )
-
-    @classmethod
-    def tearDownClass(cls):
-        super().tearDownClass()
-        shutil.rmtree(
-            tempfile.mkdtemp(dir=settings.BASE_DIR),
-            ignore_errors=True
-        )
-
-    def setUp(self):
-        self.guest_client = Client()
-        self.user = User.objects.get(username='TestUser')
-        self.authorized_client = Client()
-        self.authorized_client.force_login(self.user)
-        cache.clear()
-
+class TestPostPages(PostPagesTestCase):
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
         templates_page_names = {
@@ -94,12 +46,12 @@ class TestPostPages(TestCase):
         self.assertEqual(first_object.text, self.posts_single.text)
         self.assertEqual(first_object.author, self.posts_single.author)
         self.assertEqual(first_object.group, self.posts_single.group)
-        self.assertEqual(first_object.image, f"posts/{self.test_image}")
+        self.assertEqual(first_object.image, self.posts_single.image.name)
 
     def test_index_cache(self):
         """Шаблон index кешируется."""
         response_1 = self.guest_client.get(reverse('posts:index'))
-        Post.objects.create(text='test2', author=self.user)
+        Post.objects.filter(pk=self.posts_single.pk).update(text='test2')
         response_2 = self.guest_client.get(reverse('posts:index'))
         cache.clear()
         response_3 = self.guest_client.get(reverse('posts:index'))
@@ -115,7 +67,7 @@ class TestPostPages(TestCase):
         self.assertEqual(first_object.text, self.posts_single.text)
         self.assertEqual(first_object.author, self.posts_single.author)
         self.assertEqual(first_object.group, self.posts_single.group)
-        self.assertEqual(first_object.image, f"posts/{self.test_image}")
+        self.assertEqual(first_object.image, self.posts_single.image.name)
 
     def test_profile_page_show_correct_context(self):
         """Шаблон profile сформирован с правильным контекстом."""
@@ -126,7 +78,7 @@ class TestPostPages(TestCase):
         self.assertEqual(first_object.text, self.posts_single.text)
         self.assertEqual(first_object.author, self.posts_single.author)
         self.assertEqual(first_object.group, self.posts_single.group)
-        self.assertEqual(first_object.image, f"posts/{self.test_image}")
+        self.assertEqual(first_object.image, self.posts_single.image.name)
 
     def test_post_detail_page_show_correct_context(self):
         """Шаблон post_detail сформирован с правильным контекстом."""
@@ -137,7 +89,7 @@ class TestPostPages(TestCase):
         self.assertEqual(first_object.text, self.posts_single.text)
         self.assertEqual(first_object.author, self.posts_single.author)
         self.assertEqual(first_object.group, self.posts_single.group)
-        self.assertEqual(first_object.image, f"posts/{self.test_image}")
+        self.assertEqual(first_object.image, self.posts_single.image.name)
 
     def test_post_edit_page_show_correct_context(self):
         """Шаблон post_edit сформирован с правильным контекстом."""
@@ -230,28 +182,7 @@ class TestPostPages(TestCase):
         ).exists())
 
 
-class TestPostPagesPaginator(TestCase):
-    @classmethod
-    def setUpClass(cls):
-        super().setUpClass()
-        cls.user = User.objects.create_user(username='TestUser')
-        cls.group = Group.objects.create(
-            title='Тестовая группа',
-            slug='gruppen',
-            description='Тестовое описание группы'
-        )
-        objs = (
-            Post(text='Тестовый текст поста номер %s' % i,
-                 author=cls.user,
-                 group=cls.group
-                 ) for i in range(13)
-        )
-        Post.objects.bulk_create(objs)
-
-    def setUp(self):
-        self.guest_client = Client()
-        cache.clear()
-
+class TestPostPagesPaginator(PostListTestCase):
     def test_index_first_page_contains_ten_records(self):
         """Шаблон index сформирован пагинатор 1-я страница."""
         response = self.client.get(reverse('posts:index'))
@@ -262,3 +193,68 @@ class TestPostPagesPaginator(TestCase):
         response = self.client.get(reverse('posts:index') + '?page=2')
         self.assertEqual(
             len(response.context['page_obj']), 3)
+
+    def test_index_next_cursor_page_contains_three_records(self):
+        """Курсор after ведёт на следующую страницу index."""
+        response = self.client.get(reverse('posts:index'))
+        cursor = response.context['page_obj'].next_cursor
+        response = self.client.get(reverse('posts:index') + '?after=' + cursor)
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 3)
+        self.assertEqual(page_obj.number, 2)
+        self.assertFalse(page_obj.has_next())
+
+    def test_index_previous_cursor_returns_first_page(self):
+        """Курсор before возвращает на первую страницу index."""
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        second = self.client.get(
+            reverse('posts:index') + '?after=' + first.next_cursor
+        ).context['page_obj']
+        response = self.client.get(
+            reverse('posts:index') + '?before=' + second.previous_cursor
+        )
+        self.assertEqual(
+            list(response.context['page_obj']), list(first)
+        )
+
+    def test_keyset_page_does_not_count_rows(self):
+        """Страница по курсору выбирается одним запросом без COUNT."""
+        first = self.client.get(reverse('posts:index')).context['page_obj']
+        paginator = KeysetPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page_obj = paginator.get_page(after=first.next_cursor)
+            self.assertEqual(len(page_obj), 3)
+
+    def test_page_window_is_elided(self):
+        """В окне только первая, соседние по курсору и текущая страница."""
+        paginator = KeysetPaginator(Post.objects.all(), 1)
+        page_obj = paginator.get_page(7)
+        numbers = [number for number, query in page_obj.window]
+        self.assertEqual(numbers, [1, None, 6, 7, 8])
+        self.assertTrue(page_obj.window[2][1].startswith('?before='))
+        self.assertTrue(page_obj.window[-1][1].startswith('?after='))
+        self.assertFalse(any(
+            query and query.startswith('?page=')
+            for number, query in page_obj.window
+        ))
+        response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertContains(response, 'class="page-link" href="/"')
+
+    def test_listing_query_count(self):
+        """Число запросов к БД на странице ленты не зависит от числа постов."""
+        follower = User.objects.create_user(username='TestFollower')
+        Follow.objects.create(user=follower, author=self.user)
+        follower_client = Client()
+        follower_client.force_login(follower)
+        pages = (
+            (self.guest_client, reverse('posts:index'), 1),
+            (self.guest_client, reverse(
+                'posts:group_list', kwargs={'slug': 'gruppen'}), 2),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': 'TestUser'}), 2),
+            (follower_client, reverse('posts:follow_index'), 4),
+        )
+        for client, url, queries in pages:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    client.get(url)
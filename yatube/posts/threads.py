@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.db.models import F, Q
+
+from .models import COMMENT_PATH_END, COMMENT_PATH_STEP, Comment
+
+
+def path_segment(comment_id):
+    return f'{comment_id:0{COMMENT_PATH_STEP}d}'
+
+
+def ancestor_ids(path):
+    """Номера предков комментария по его пути."""
+    return [
+        int(path[start:start + COMMENT_PATH_STEP])
+        for start in range(0, len(path) - COMMENT_PATH_STEP, COMMENT_PATH_STEP)
+    ]
+
+
+def attach_comment(comment):
+    """Ставит новый комментарий в ветку и считает его у всех предков.
+
+    Ответ глубже COMMENT_MAX_DEPTH становится ответом на ближайшего
+    допустимого предка.
+    """
+    if comment.parent_id is None:
+        parent_path = ''
+    else:
+        parent_path = Comment.objects.filter(
+            pk=comment.parent_id
+        ).values_list('path', flat=True).get()
+        limit = settings.COMMENT_MAX_DEPTH * COMMENT_PATH_STEP
+        if len(parent_path) > limit:
+            parent_path = parent_path[:limit]
+            comment.parent_id = int(parent_path[-COMMENT_PATH_STEP:])
+    comment.path = parent_path + path_segment(comment.pk)
+    comment.depth = len(parent_path) // COMMENT_PATH_STEP
+    Comment.objects.filter(pk=comment.pk).update(
+        path=comment.path, depth=comment.depth, parent_id=comment.parent_id
+    )
+    change_reply_counts(comment.path, 1)
+
+
+def change_reply_counts(path, delta):
+    Comment.objects.filter(pk__in=ancestor_ids(path)).update(
+        reply_count=F('reply_count') + delta
+    )
+
+
+def thread_replies(root, after=None):
+    """Ответы на root в порядке показа, начиная после пути after."""
+    replies = Comment.objects.for_post(root.post_id).subtree(root)
+    if after:
+        replies = replies.filter(path__gt=after)
+    return replies
+
+
+def reply_page(root, after=None):
+    """Ответы на root после after, не больше COMMENT_THREAD_REPLIES,
+    и курсор следующих или None.
+    """
+    limit = settings.COMMENT_THREAD_REPLIES
+    replies = list(thread_replies(root, after)[:limit + 1])
+    if len(replies) > limit:
+        return replies[:limit], replies[limit - 1].path
+    return replies, None
+
+
+def load_threads(comments):
+    """Кладёт в comment.thread ответы на корневые комментарии страницы.
+
+    Ветки не длиннее COMMENT_THREAD_REPLIES читаются одним запросом по
+    диапазонам индекса (post, path) в порядке показа. Длинные ветки
+    читаются отдельно и обрезаются: путь последнего показанного ответа
+    кладётся в comment.replies_cursor для подгрузки остальных.
+    """
+    limit = settings.COMMENT_THREAD_REPLIES
+    roots = {}
+    ranges = Q()
+    for comment in comments:
+        comment.thread = []
+        comment.replies_cursor = None
+        if comment.reply_count > limit:
+            comment.thread, comment.replies_cursor = reply_page(comment)
+        elif comment.reply_count:
+            roots[comment.path] = comment
+            ranges |= Q(
+                path__gt=comment.path,
+                path__lt=comment.path + COMMENT_PATH_END
+            )
+    if not roots:
+        return
+    replies = Comment.objects.for_post(comments[0].post_id).filter(
+        ranges
+    ).order_by('path')
+    for reply in replies:
+        roots[reply.path[:COMMENT_PATH_STEP]].thread.append(reply)
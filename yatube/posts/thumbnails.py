@@ -0,0 +1,299 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from PIL import features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import deserialize, serialize
+from sorl.thumbnail.images import (ImageFile, deserialize_image_file,
+                                   serialize_image_file)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from .models import Post, ThumbnailJob
+
+logger = logging.getLogger(__name__)
+
+# Варианты картинки карточки для srcset: ширины и форматы. WebP
+# создаётся, только если Pillow собран с libwebp; JPEG нужен браузерам
+# без WebP и как src по умолчанию.
+CARD_WIDTHS = (480, 720, 960)
+CARD_ASPECT = 339 / 960
+CARD_SIZES = '(max-width: 960px) 100vw, 960px'
+CARD_FORMATS = ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',)
+
+
+def variant_name(preset, width, image_format):
+    return f'{preset}-{width}-{image_format.lower()}'
+
+
+# Миниатюры, которые выводят шаблоны: имя -> (геометрия, опции sorl)
+THUMBNAILS = {
+    variant_name('card', width, image_format): (
+        f'{width}x{round(width * CARD_ASPECT)}',
+        {'crop': 'center', 'upscale': True, 'format': image_format},
+    )
+    for width in CARD_WIDTHS
+    for image_format in CARD_FORMATS
+}
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюру, не создавая её."""
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        """Возвращает миниатюру из хранилища ключей sorl или None.
+
+        Исходная картинка не открывается, поэтому запрос страницы
+        никогда не ждёт PIL.
+        """
+        return default.kvstore.get(
+            self.get_thumbnail_file(file_, geometry_string, **options)
+        )
+
+    def get_thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры с тем же именем, что даст get_thumbnail()."""
+        source = ImageFile(file_)
+        self.prepare_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def prepare_options(self, source, options):
+        # Те же опции по умолчанию, что и в get_thumbnail(): от них
+        # зависит имя файла миниатюры.
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+
+
+backend = ReadyThumbnailBackend()
+
+
+def ready_thumbnail(image, name):
+    """Готовая миниатюра name для картинки image или None."""
+    if not image:
+        return None
+    geometry, options = THUMBNAILS[name]
+    return backend.get_ready_thumbnail(image, geometry, **options)
+
+
+def card_widths(image_width):
+    """Ширины вариантов карточки, не растягивающие исходную картинку."""
+    if not image_width:
+        return CARD_WIDTHS
+    return (
+        tuple(width for width in CARD_WIDTHS if width <= image_width)
+        or CARD_WIDTHS[:1]
+    )
+
+
+def card_picture(thumbnails, image_width=None):
+    """Данные для <picture> карточки из готовых миниатюр.
+
+    Возвращает словарь со строками srcset по форматам и самым широким
+    JPEG для src или None, если JPEG ещё не готов. Варианты, которых
+    пока нет, и растянутые шире исходной картинки шириной image_width
+    в srcset не попадают.
+    """
+    srcsets = {}
+    fallback = None
+    for image_format in CARD_FORMATS:
+        candidates = []
+        for width in card_widths(image_width):
+            thumbnail = thumbnails[variant_name('card', width, image_format)]
+            if thumbnail is not None:
+                candidates.append(f'{thumbnail.url} {thumbnail.width}w')
+                if image_format == 'JPEG':
+                    fallback = thumbnail
+        srcsets[image_format.lower()] = ', '.join(candidates)
+    if fallback is None:
+        return None
+    return {'srcsets': srcsets, 'img': fallback, 'sizes': CARD_SIZES}
+
+
+def post_thumbnails(post):
+    """Готовые миниатюры поста, если их не нашёл prefetch_thumbnails()."""
+    if getattr(post, 'thumbnails', None) is None:
+        prefetch_thumbnails([post])
+    return post.thumbnails
+
+
+def prefetch_thumbnails(posts):
+    """Находит готовые миниатюры картинок постов одним get_many.
+
+    Кладёт в post.thumbnails словарь имя -> миниатюра или None. Ключи,
+    которых нет в кеше, дочитываются из базы одним запросом и кешируются,
+    как это делает хранилище ключей sorl.
+    """
+    keys = {}
+    for post in posts:
+        post.thumbnails = dict.fromkeys(THUMBNAILS)
+        if not post.image:
+            continue
+        for name, (geometry, options) in THUMBNAILS.items():
+            thumbnail = backend.get_thumbnail_file(
+                post.image, geometry, **options
+            )
+            keys.setdefault(add_prefix(thumbnail.key), []).append(
+                (post, name)
+            )
+    if not keys:
+        return
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        found = dict(
+            KVStore.objects.filter(key__in=missing).values_list('key', 'value')
+        )
+        fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(
+            fetched, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        values.update(fetched)
+    for key, targets in keys.items():
+        if values[key] == EMPTY_VALUE:
+            continue
+        for post, name in targets:
+            post.thumbnails[name] = deserialize_image_file(values[key])
+
+
+def enqueue_thumbnails(post):
+    """Ставит генерацию миниатюр картинки поста в очередь."""
+    ThumbnailJob.objects.update_or_create(
+        post=post, defaults={'run_after': timezone.now(), 'attempts': 0}
+    )
+
+
+def generate_thumbnails(image):
+    """Создаёт все миниатюры картинки; True, если все готовы."""
+    for geometry, options in THUMBNAILS.values():
+        backend.get_thumbnail(image, geometry, **options)
+    return all(ready_thumbnail(image, name) for name in THUMBNAILS)
+
+
+def process_thumbnail_jobs(limit):
+    """Выполняет до limit задач очереди, срок которых наступил.
+
+    Задача сначала захватывается переносом run_after на время аренды,
+    так что несколько обработчиков не берут одну задачу. Неудачная
+    задача повторяется с растущей задержкой. Возвращает число
+    захваченных задач.
+    """
+    now = timezone.now()
+    jobs = ThumbnailJob.objects.filter(
+        run_after__lte=now
+    ).select_related('post').order_by('run_after')[:limit]
+    claimed = 0
+    for job in jobs:
+        lease = now + timedelta(seconds=settings.THUMBNAIL_JOB_LEASE)
+        if not ThumbnailJob.objects.filter(
+            pk=job.pk, run_after=job.run_after
+        ).update(run_after=lease):
+            continue
+        claimed += 1
+        post = job.post
+        try:
+            ready = not post.image or generate_thumbnails(post.image)
+        except Exception:
+            logger.exception('Не удалось создать миниатюры поста %s', post.pk)
+            ready = False
+        # Если картинку поменяли во время работы, задача уже переставлена
+        # и не совпадёт по run_after.
+        leased_job = ThumbnailJob.objects.filter(pk=job.pk, run_after=lease)
+        if ready:
+            leased_job.delete()
+            # Карточка и страницы лент перестают показывать заглушку.
+            post.save(update_fields=['updated'])
+        elif job.attempts + 1 >= settings.THUMBNAIL_JOB_MAX_ATTEMPTS:
+            logger.error('Миниатюры поста %s не созданы', post.pk)
+            leased_job.delete()
+        else:
+            delay = settings.THUMBNAIL_JOB_RETRY_DELAY * 2 ** job.attempts
+            leased_job.update(
+                attempts=job.attempts + 1,
+                run_after=timezone.now() + timedelta(seconds=delay)
+            )
+    return claimed
+
+
+def render_thumbnails(image_name, force=False):
+    """Создаёт файлы всех миниатюр картинки, не трогая базу.
+
+    Вызывается в процессах пула. Возвращает сериализованные картинку
+    и её миниатюры для store_thumbnails(). Существующие файлы
+    пересоздаются только при force.
+    """
+    source = ImageFile(image_name, Post._meta.get_field('image').storage)
+    source_image = default.engine.get_image(source)
+    try:
+        source.set_size(default.engine.get_image_size(source_image))
+        thumbnails = []
+        for geometry, options in THUMBNAILS.values():
+            options = dict(options)
+            backend.prepare_options(source, options)
+            name = backend._get_thumbnail_filename(source, geometry, options)
+            thumbnail = ImageFile(name, default.storage)
+            if force or not thumbnail.exists():
+                options['image_info'] = default.engine.get_image_info(
+                    source_image
+                )
+                backend._create_thumbnail(
+                    source_image, geometry, options, thumbnail
+                )
+                backend._create_alternative_resolutions(
+                    source_image, geometry, options, thumbnail.name
+                )
+            else:
+                thumbnail.set_size()
+            thumbnails.append(serialize_image_file(thumbnail))
+    finally:
+        default.engine.cleanup(source_image)
+    return serialize_image_file(source), thumbnails
+
+
+def store_thumbnails(results):
+    """Записывает результаты render_thumbnails() в хранилище sorl.
+
+    Вместо нескольких запросов на каждую миниатюру, как в
+    kvstore.set(), вся пачка пишется одной транзакцией и одним
+    cache.set_many().
+    """
+    values = {}
+    thumbnail_keys = {}
+    for source, thumbnails in results:
+        source_key = deserialize_image_file(source).key
+        values[add_prefix(source_key)] = source
+        keys = thumbnail_keys.setdefault(
+            add_prefix(source_key, 'thumbnails'), set()
+        )
+        for thumbnail in thumbnails:
+            thumbnail_key = deserialize_image_file(thumbnail).key
+            values[add_prefix(thumbnail_key)] = thumbnail
+            keys.add(thumbnail_key)
+    # Список миниатюр картинки дополняется, как в kvstore.set().
+    for key, value in KVStore.objects.filter(
+        key__in=thumbnail_keys
+    ).values_list('key', 'value'):
+        thumbnail_keys[key].update(deserialize(value))
+    for key, keys in thumbnail_keys.items():
+        values[key] = serialize(sorted(keys))
+    with transaction.atomic():
+        KVStore.objects.filter(key__in=values).delete()
+        KVStore.objects.bulk_create(
+            KVStore(key=key, value=value) for key, value in values.items()
+        )
+    default.kvstore.cache.set_many(
+        values, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+    )
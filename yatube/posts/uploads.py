@@ -0,0 +1,153 @@
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import (TemporaryUploadedFile,
+                                            UploadedFile)
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+# Первые байты файлов форматов, которые принимаются как картинки
+IMAGE_SIGNATURES = (
+    b'\xff\xd8\xff',
+    b'\x89PNG\r\n\x1a\n',
+    b'GIF87a',
+    b'GIF89a',
+)
+NOT_AN_IMAGE = 'Загрузите картинку в формате JPEG, PNG, GIF или WebP.'
+BROKEN_IMAGE = 'Файл картинки повреждён.'
+
+
+def is_image_header(data):
+    """Похожи ли первые байты файла на картинку поддерживаемого формата."""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return True
+    return data.startswith(IMAGE_SIGNATURES)
+
+
+def clean_image(file):
+    """Убирает EXIF и уменьшает картинку больше IMAGE_UPLOAD_MAX_DIMENSION.
+
+    EXIF хранит, среди прочего, координаты съёмки, поэтому картинка с
+    ним пересохраняется без него; ориентация из EXIF применяется
+    заранее. Анимации не пересохраняются: кадры потерялись бы.
+    Возвращает True, если файл изменён.
+    """
+    limit = settings.IMAGE_UPLOAD_MAX_DIMENSION
+    file.seek(0)
+    with Image.open(file) as image:
+        oversized = max(image.size) > limit
+        if getattr(image, 'is_animated', False) or not (
+            oversized or 'exif' in image.info
+        ):
+            return False
+        image_format = image.format
+        if oversized:
+            # JPEG декодируется сразу в уменьшенном масштабе.
+            image.draft(image.mode, (limit, limit))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit), Image.LANCZOS)
+        file.seek(0)
+        file.truncate()
+        image.save(file, format=image_format, quality=90)
+    file.size = file.tell()
+    file.seek(0)
+    return True
+
+
+class RejectedUpload(UploadedFile):
+    """Пустой файл на месте отклонённой загрузки с причиной отказа."""
+
+    def __init__(self, name, content_type, error):
+        super().__init__(BytesIO(), name, content_type, 0)
+        self.upload_error = error
+
+
+def size_error():
+    limit = filesizeformat(settings.IMAGE_UPLOAD_MAX_SIZE)
+    return f'Картинка должна быть не больше {limit}.'
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """Принимает картинки во временный файл с ограничением размера.
+
+    На файле, не похожем на картинку по первым байтам или больше
+    IMAGE_UPLOAD_MAX_SIZE, чтение запроса прекращается, остаток тела
+    не читается. Запрос, длина которого заведомо больше картинки и
+    полей формы, отклоняется до чтения файла. Отклонённый файл
+    сохраняется в request.rejected_upload для image_uploads.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        limit = (
+            settings.IMAGE_UPLOAD_MAX_SIZE
+            + (settings.DATA_UPLOAD_MAX_MEMORY_SIZE or 0)
+        )
+        self.body_too_large = content_length > limit
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = None
+        if self.body_too_large:
+            self.reject(size_error())
+        self.file = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0 and not is_image_header(raw_data):
+            self.reject(NOT_AN_IMAGE)
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_SIZE:
+            self.reject(size_error())
+        self.file.write(raw_data)
+        return None
+
+    def reject(self, error):
+        if self.file:
+            self.file.close()
+        self.request.rejected_upload = (
+            self.field_name,
+            RejectedUpload(self.file_name, self.content_type, error)
+        )
+        raise StopUpload(connection_reset=True)
+
+    def file_complete(self, file_size):
+        self.file.size = file_size
+        try:
+            clean_image(self.file)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            self.file.close()
+            return RejectedUpload(
+                self.file_name, self.content_type, BROKEN_IMAGE
+            )
+        self.file.seek(0)
+        return self.file
+
+
+def image_uploads(view):
+    """Принимает файлы запросов к view через ImageUploadHandler.
+
+    Обработчики заменяются до чтения тела запроса, поэтому CSRF
+    проверяется уже после замены. Отклонённый файл попадает в
+    request.FILES как RejectedUpload с причиной отказа.
+    """
+    @wraps(view)
+    def add_rejected(request, *args, **kwargs):
+        files = request.FILES
+        rejected = getattr(request, 'rejected_upload', None)
+        if rejected:
+            files.appendlist(*rejected)
+        return view(request, *args, **kwargs)
+
+    protected = csrf_protect(add_rejected)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
@@ -1,29 +1,52 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Post, Group, User, Follow
-from django.core.paginator import Paginator
+from .models import Post, Group, User, Follow, UserStats, Comment, Tag
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
+from django.http import JsonResponse
+from django.views.decorators.http import condition
+from .autocomplete import suggest
+from .caching import (GLOBAL_FEED, author_feed, cache_feed, feed_etag,
+                      feed_last_modified, group_feed, mark_written,
+                      mention_feed, post_feed, tag_feed)
+from .paginators import (COMMENTS_PER_PAGE, CommentPaginator,
+                         get_page_obj)
+from .feed import FeedEntryPaginator, follow_feed
+from .search import SearchPaginator, match_expression, search_posts
+from .threads import load_threads, reply_page
+from .uploads import image_uploads
 
 
-@cache_page(20)
+def index_feeds():
+    return [GLOBAL_FEED]
+
+
+@condition(
+    etag_func=feed_etag(index_feeds),
+    last_modified_func=feed_last_modified(index_feeds)
+)
+@cache_feed(index_feeds)
 def index(request):
     templates = 'posts/index.html'
-    posts = Post.objects.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = Post.objects.feed()
+    page_obj = get_page_obj(request, posts)
     context = {'page_obj': page_obj, }
     return render(request, templates, context)
 
 
+def group_feeds(slug):
+    return [group_feed(slug)]
+
+
+@condition(
+    etag_func=feed_etag(group_feeds),
+    last_modified_func=feed_last_modified(group_feeds)
+)
+@cache_feed(group_feeds)
 def group_posts(request, slug):
     templates = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.feed()
+    page_obj = get_page_obj(request, posts)
     context = {
         'page_obj': page_obj,
         'group': group,
@@ -31,44 +54,185 @@ def group_posts(request, slug):
     return render(request, templates, context)
 
 
-def profile(request, username):
-    template = 'posts/profile.html'
+def tag_feeds(name):
+    return [tag_feed(name)]
+
+
+@condition(
+    etag_func=feed_etag(tag_feeds),
+    last_modified_func=feed_last_modified(tag_feeds)
+)
+@cache_feed(tag_feeds)
+def tag_posts(request, name):
+    templates = 'posts/post_list.html'
+    tag = get_object_or_404(Tag, name=name)
+    page_obj = get_page_obj(
+        request, tag.post_tags.all(), paginator_class=FeedEntryPaginator
+    )
+    context = {
+        'page_obj': page_obj,
+        'title': f'Записи с хештегом {tag}',
+    }
+    return render(request, templates, context)
+
+
+def mention_feeds(username):
+    return [mention_feed(username)]
+
+
+@condition(
+    etag_func=feed_etag(mention_feeds),
+    last_modified_func=feed_last_modified(mention_feeds)
+)
+@cache_feed(mention_feeds)
+def mentions(request, username):
+    templates = 'posts/post_list.html'
     user = get_object_or_404(User, username=username)
-    post_list = user.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    post_count = post_list.count()
+    page_obj = get_page_obj(
+        request, user.mentions.all(), paginator_class=FeedEntryPaginator
+    )
+    context = {
+        'page_obj': page_obj,
+        'title': f'Записи, где упомянут @{user.username}',
+    }
+    return render(request, templates, context)
+
+
+def profile_holes(request, username):
     following = False
     if request.user.is_authenticated:
-        if Follow.objects.filter(author=user, user=request.user).exists():
+        if Follow.objects.filter(
+            author__username=username, user=request.user
+        ).exists():
             following = True
+    return {'author_username': username, 'following': following}
+
+
+def profile_feeds(username):
+    return [author_feed(username)]
+
+
+@condition(
+    etag_func=feed_etag(profile_feeds),
+    last_modified_func=feed_last_modified(profile_feeds)
+)
+@cache_feed(profile_feeds, holes=profile_holes)
+def profile(request, username):
+    template = 'posts/profile.html'
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = user.posts.feed()
+    page_obj = get_page_obj(request, post_list)
+    # Строки статистики нет у пользователей до recount_stats.
+    stats = getattr(user, 'stats', None)
+    post_count = stats.post_count if stats else 0
     context = {
         'author': user,
         'page_obj': page_obj,
         'post_count': post_count,
-        'following': following
     }
     return render(request, template, context)
 
 
+def post_detail_holes(request, post_id):
+    post_counts = UserStats.objects.filter(
+        user__posts=post_id
+    ).values_list('post_count', flat=True)
+    return {
+        'post_id': post_id,
+        'post_count': next(iter(post_counts), 0),
+        'form': CommentForm(request.POST or None),
+    }
+
+
+def get_comment_page(request, post_id):
+    """Страница веток комментариев: корни по курсору и ответы к ним."""
+    comments = get_page_obj(
+        request,
+        Comment.objects.for_post(post_id).filter(parent=None),
+        COMMENTS_PER_PAGE,
+        CommentPaginator
+    )
+    load_threads(comments.object_list)
+    return comments
+
+
+def post_detail_feeds(post_id, **kwargs):
+    return [post_feed(post_id)]
+
+
+@condition(
+    etag_func=feed_etag(post_detail_feeds),
+    last_modified_func=feed_last_modified(post_detail_feeds)
+)
+@cache_feed(post_detail_feeds, holes=post_detail_holes)
 def post_detail(request, post_id):
     template = 'posts/post_detail.html'
-    post_single = get_object_or_404(Post, id=post_id)
-    user = post_single.author
-    post_count = Post.objects.filter(author=user).count()
-    form = CommentForm(request.POST or None)
-    comments = post_single.comments.all()
+    post_single = get_object_or_404(Post.objects.feed(), id=post_id)
+    comments = get_comment_page(request, post_id)
     context = {
         'post': post_single,
-        'post_count': post_count,
-        'form': form,
         'comments': comments
     }
     return render(request, template, context)
 
 
+@cache_feed(post_detail_feeds)
+def comment_list(request, post_id):
+    """Следующая страница комментариев поста для подгрузки."""
+    template = 'posts/includes/comment_list.html'
+    comments = get_comment_page(request, post_id)
+    return render(request, template, {
+        'post_id': post_id,
+        'comments': comments
+    })
+
+
+@cache_feed(post_detail_feeds)
+def comment_replies(request, post_id, comment_id):
+    """Следующие ответы длинной ветки комментария для подгрузки."""
+    template = 'posts/includes/comment_replies.html'
+    root = get_object_or_404(
+        Comment.objects.only('post_id', 'path', 'depth'),
+        pk=comment_id,
+        post_id=post_id
+    )
+    after = request.GET.get('after', '')
+    if not after.startswith(root.path):
+        after = None
+    replies, cursor = reply_page(root, after)
+    return render(request, template, {
+        'post_id': post_id,
+        'root': root,
+        'replies': replies,
+        'replies_cursor': cursor,
+    })
+
+
+def search(request):
+    """Поиск постов по тексту, самые релевантные выше."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    expression = match_expression(query)
+    page_obj = None
+    if expression:
+        page_obj = get_page_obj(
+            request,
+            search_posts(Post.objects.feed(), expression),
+            paginator_class=SearchPaginator
+        )
+    context = {'query': query, 'page_obj': page_obj}
+    return render(request, template, context)
+
+
+def autocomplete(request):
+    """Подсказки пользователей, групп и хештегов по началу строки."""
+    return JsonResponse({'results': suggest(request.GET.get('q', ''))})
+
+
 @login_required
+@image_uploads
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(
@@ -80,6 +244,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            mark_written(request)
             return redirect('posts:profile', username=request.user.username)
         else:
             context = {'form': form}
@@ -88,6 +253,7 @@ def post_create(request):
 
 
 @login_required
+@image_uploads
 def post_edit(request, post_id):
     template = 'posts/create_post.html'
     post = get_object_or_404(Post, id=post_id)
@@ -103,6 +269,7 @@ def post_edit(request, post_id):
             post.author = request.user
             post.group = post.group
             post.save()
+            mark_written(request)
             return redirect('posts:post_detail', post_id=post.id)
     return render(request, template, {
         'form': form,
@@ -119,6 +286,11 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        parent_id = request.POST.get('parent')
+        if parent_id and parent_id.isdigit():
+            comment.parent = Comment.objects.filter(
+                pk=parent_id, post=post
+            ).first()
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
@@ -126,10 +298,8 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    feed, paginator_class = follow_feed(request.user)
+    page_obj = get_page_obj(request, feed, paginator_class=paginator_class)
     context = {'page_obj': page_obj, }
     return render(request, template, context)
 
@@ -63,6 +63,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# тесты очищают кеш, поэтому работают с временным файлом кеша
+TEST_RUNNER = 'core.test_runner.TemporaryCacheRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -145,9 +148,69 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
-# подключаем кеширование
+# подключаем кеширование: файл кеша общий для всех процессов сервера,
+# перед ним у каждого процесса свой короткоживущий кеш в памяти
+CACHE_PATH = os.environ.get(
+    'YATUBE_CACHE_PATH', os.path.join(BASE_DIR, 'cache.sqlite3')
+)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache_backends.TwoLevelCache',
+        'LOCATION': CACHE_PATH + '.stamps',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_TIMEOUT': 5,
+            'L1_MAX_ENTRIES': 1000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': CACHE_PATH,
+        'OPTIONS': {
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
+    },
 }
+
+# Лента подписок: посты авторов, у которых подписчиков больше этого
+# порога, не раскладываются по лентам и подмешиваются при чтении
+FEED_FANOUT_LIMIT = 10000
+FEED_BATCH_SIZE = 1000
+
+# Страницы лент живут в кеше до записи в ленту, но не дольше этого
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Столько секунд после своей записи автор читает ленты мимо кеша
+FEED_CACHE_RYW_SECONDS = 30
+# Карточки постов меняют ключ при правке поста, старые просто истекают
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Защита от одновременного пересчёта страниц лент: срок блокировки,
+# сколько ждать чужого результата и как часто проверять, а также
+# коэффициент вероятностного пересчёта до истечения записи
+FEED_CACHE_LOCK_TIMEOUT = 10
+FEED_CACHE_LOCK_WAIT = 2
+FEED_CACHE_LOCK_POLL = 0.05
+FEED_CACHE_EARLY_BETA = 1.0
+
+# Очередь генерации миниатюр: сколько задач брать за раз и как часто
+# проверять очередь, срок аренды задачи обработчиком, повторы неудач
+THUMBNAIL_JOB_BATCH_SIZE = 50
+THUMBNAIL_JOB_POLL = 1
+THUMBNAIL_JOB_LEASE = 60 * 5
+THUMBNAIL_JOB_MAX_ATTEMPTS = 5
+THUMBNAIL_JOB_RETRY_DELAY = 30
+
+# Загрузка картинок (posts.uploads.image_uploads): файл пишется во
+# временный файл, и чтение запроса прекращается, как только файл
+# превысит размер; картинки больше этого по стороне уменьшаются
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_DIMENSION = 2560
+
+# Подсказки поиска: снимок индекса в кеше пересобирается из базы с
+# таким периодом, изменения между сборками хранятся в журнале
+AUTOCOMPLETE_SNAPSHOT_TIMEOUT = 60 * 60
+AUTOCOMPLETE_CHANGE_TIMEOUT = 60 * 60 * 2
+
+# Ответы глубже этого уровня крепятся к предку на этом уровне
+COMMENT_MAX_DEPTH = 8
+# Ответов под корнем на странице поста; остальные подгружаются по ссылке
+COMMENT_THREAD_REPLIES = 10